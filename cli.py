@@ -0,0 +1,352 @@
+import os
+import csv
+import sys
+import glob
+import json
+import argparse
+
+from utils.parse_out import get_files, OUT_SUFFIXES
+from utils.cache import DomainCache
+from utils.consts import RESIDUAL_TARGET
+from utils.script import write_session, convert_path
+from utils.template import load_template
+from utils.result_cache import ResultCache, collect_results
+from utils.checkpoint import save_run_state, load_run_state, read_checkpoint
+from utils.expressions import hoist_calls, output_expressions
+from utils.topology import mesh_groups
+from utils.incremental import expressions_hash
+
+
+def expand_files(patterns: list, ext: str='res') -> list:
+    # Directories, glob patterns and plain paths, in the given order
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            files += sorted(get_files(ext=ext, directory=pattern))
+        else:
+            files += sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+    return [convert_path(os.path.abspath(f)) for f in files]
+
+
+def load_inputs(args: argparse.Namespace) -> tuple:
+    # (template, domains, res files) or None after reporting the error
+    try:
+        template = load_template(args.template)
+    except (OSError, json.JSONDecodeError, KeyError) as ex:
+        print(f'Invalid template file {args.template}: {ex}', file=sys.stderr)
+        return None
+    try:
+        output_expressions(template['expressions'])
+    except ValueError as ex:
+        print(f'Invalid expressions in {args.template}: {ex}', file=sys.stderr)
+        return None
+
+    domains = {}
+    if args.out:
+        try:
+            domains = DomainCache().get_domains(outfile=args.out)
+        except (OSError, ValueError) as ex:
+            print(f'Cannot read out file {args.out}: {ex}', file=sys.stderr)
+            return None
+
+    return template, domains, expand_files(args.res)
+
+
+def load_groups(args: argparse.Namespace, res_files: list) -> dict:
+    # {res file: mesh group} in topology mode, {} outside of it and None
+    # after reporting the error
+    if not (args.topology or args.groups):
+        return {}
+    grouping = {}
+    if args.groups:
+        try:
+            with open(args.groups, 'r') as f:
+                grouping = {
+                    group: [convert_path(os.path.abspath(p)) for p in paths]
+                    for group, paths in json.load(f).items()
+                }
+        except (OSError, json.JSONDecodeError, AttributeError) as ex:
+            print(f'Invalid groups file {args.groups}: {ex}', file=sys.stderr)
+            return None
+    groups = mesh_groups(res_files, grouping)
+    print(f'{len(set(groups.values()))} mesh groups, {len(res_files) - len(groups)} res files without one')
+    return groups
+
+
+def report_hoisting(template: dict, res_files: list) -> None:
+    exps = output_expressions(template['expressions'])[0]
+    if unused := len(template['expressions']) - len(exps):
+        print(f'{unused} expressions no checked output depends on are not computed')
+    if saved := hoist_calls(exps)[2]:
+        print(f'{saved} repeated integrations per res file computed once, {saved * len(res_files)} saved')
+
+
+def generate(args: argparse.Namespace) -> int:
+    if not (inputs := load_inputs(args)):
+        return 1
+    template, domains, res_files = inputs
+    if (groups := load_groups(args, res_files)) is None:
+        return 1
+
+    output_dir = os.path.abspath(args.output_dir)
+    state = {
+        'expressions': template['expressions'], 'res_files': res_files, 'domains': domains,
+        'performance_map': template['performance_map'], 'incremental': args.incremental,
+        'cache': args.cache, 'groups': groups
+    }
+    save_run_state(output_dir, **state)
+    cse = write_session(output_dir, state)
+    print(f'{cse}: {len(res_files)} res files, {len(template["expressions"])} expressions')
+    report_hoisting(template, res_files)
+    return 0
+
+
+def resume(args: argparse.Namespace) -> int:
+    output_dir = os.path.abspath(args.output_dir)
+    try:
+        state = load_run_state(output_dir)
+    except (OSError, json.JSONDecodeError) as ex:
+        print(f'No run to resume in {output_dir}: {ex}', file=sys.stderr)
+        return 1
+
+    done = read_checkpoint(output_dir)
+    cse = write_session(output_dir, state, done=done)
+    finished = len(done['files']) + sum(map(len, done['curves'].values()))
+    print(f'{cse}: resumes after {finished} finished res files')
+    return 0
+
+
+def run(args: argparse.Namespace) -> int:
+    # The thread pool and subprocess imports are only needed here
+    from utils.batch import run_batch
+
+    if not (inputs := load_inputs(args)):
+        return 1
+    template, domains, res_files = inputs
+    if (groups := load_groups(args, res_files)) is None:
+        return 1
+
+    output_dir = os.path.abspath(args.output_dir)
+    missing = run_batch(
+        output_dir=convert_path(output_dir), expressions=template['expressions'],
+        res_files=res_files, domains=domains, workers=args.workers, cfdpost=args.cfdpost,
+        memory_budget=int(args.memory_budget * 2**30) if args.memory_budget else None,
+        incremental=args.incremental, cache=ResultCache() if args.cache else None, groups=groups,
+        performance_map=template['performance_map'], report=lambda message: print(message, file=sys.stderr)
+    )
+    print(f'{os.path.join(output_dir, "output.csv")}: {len(res_files) - len(missing)} of {len(res_files)} res files')
+    report_hoisting(template, res_files)
+    for f in missing:
+        print(f'No results for {f}', file=sys.stderr)
+    return 1 if missing else 0
+
+
+def collect(args: argparse.Namespace) -> int:
+    # Joins the results.tsv of a cached 'generate' run with the cache
+    if not (inputs := load_inputs(args)):
+        return 1
+    template, _, res_files = inputs
+
+    output_dir = os.path.abspath(args.output_dir)
+    exps, header = output_expressions(template['expressions'])
+    missing = collect_results(ResultCache(), output_dir, res_files, exps, header=header)
+    print(f'{os.path.join(output_dir, "output.csv")}: {len(res_files) - len(missing)} of {len(res_files)} res files')
+    for f in missing:
+        print(f'No results for {f}', file=sys.stderr)
+    return 1 if missing else 0
+
+
+def ingest(args: argparse.Namespace) -> int:
+    # Adds the csv files of a finished run to the results store
+    # NumPy is only imported by the commands that need it, see tools/import_time.py
+    from utils.results_store import ResultsStore
+
+    template_id = None
+    if args.template:
+        try:
+            template = load_template(args.template)
+            template_id = expressions_hash(*output_expressions(template['expressions']))
+        except (OSError, json.JSONDecodeError, KeyError, ValueError) as ex:
+            print(f'Invalid template file {args.template}: {ex}', file=sys.stderr)
+            return 1
+
+    output_dir = os.path.abspath(args.output_dir)
+    try:
+        store = ResultsStore(args.store, parquet=args.parquet) if args.store else ResultsStore(parquet=args.parquet)
+    except ImportError as ex:
+        print(ex, file=sys.stderr)
+        return 1
+    ids = store.ingest_run(output_dir, run_id=args.run_id, template_id=template_id)
+    if not ids:
+        print(f'No output.csv or performance_map.csv in {output_dir}', file=sys.stderr)
+        return 1
+    for table, run_id in ids.items():
+        print(f'{table}: run {run_id}')
+    return 0
+
+
+def history(args: argparse.Namespace) -> int:
+    # Convergence summary of the .out files of finished runs
+    from utils.history import summarise
+
+    outfiles = expand_files(args.files, ext=tuple(s[1:] for s in OUT_SUFFIXES))
+    if not outfiles:
+        print('No out files', file=sys.stderr)
+        return 1
+    try:
+        summaries = summarise(outfiles, target=args.target, workers=args.workers, save_dir=args.save)
+    except OSError as ex:
+        print(f'Cannot write histories: {ex}', file=sys.stderr)
+        return 1
+    errors = [summary for summary in summaries if 'error' in summary]
+    summaries = [summary for summary in summaries if 'error' not in summary]
+
+    output_dir = os.path.abspath(args.output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, 'history.csv')
+    columns = list(dict.fromkeys(k for summary in summaries for k in summary))
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, columns, lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(summaries)
+    converged = sum(summary['converged'] is not None for summary in summaries)
+    print(f'{path}: {converged} of {len(summaries)} runs converged to RMS {args.target:g}')
+    for summary in errors:
+        print(f'Cannot read out file {summary["file"]}: {summary["error"]}', file=sys.stderr)
+    return 1 if errors else 0
+
+
+def scan(args: argparse.Namespace) -> int:
+    # campaign.json with the .out/.res pairs and domains of run directory trees
+    from utils.campaign import scan_campaign
+
+    runs = scan_campaign(args.roots, workers=args.workers)
+    output_dir = os.path.abspath(args.output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, 'campaign.json')
+    with open(path, 'w') as f:
+        json.dump(runs, f, indent=1)
+
+    paired = sum(bool(run['out'] and run['res']) for run in runs.values())
+    layouts = {json.dumps(run['domains'], sort_keys=True) for run in runs.values() if run['domains'] is not None}
+    print(f'{path}: {len(runs)} runs, {paired} with .out and .res, {len(layouts)} domain layouts')
+    for run in runs.values():
+        if run['error']:
+            print(f'Cannot read out file {run["out"]}: {run["error"]}', file=sys.stderr)
+    return 1 if any(run['error'] for run in runs.values()) else 0
+
+
+def watch_folder(args: argparse.Namespace) -> int:
+    # Appends the rows of new res files to output.csv until interrupted or idle
+    from utils.watch import watch
+
+    if not (inputs := load_inputs(args)):
+        return 1
+    template, domains, _ = inputs
+    if not os.path.isdir(args.directory):
+        print(f'No directory {args.directory}', file=sys.stderr)
+        return 1
+
+    output_dir = os.path.abspath(args.output_dir)
+    print(f'Watching {args.directory} for res files, rows go to {os.path.join(output_dir, "output.csv")}')
+    try:
+        computed = watch(
+            args.directory, output_dir, template['expressions'], domains=domains,
+            interval=args.interval, settle=args.settle, batch_size=args.batch, recursive=args.recursive,
+            topology=args.topology, idle=args.idle, workers=args.workers, cfdpost=args.cfdpost,
+            memory_budget=int(args.memory_budget * 2**30) if args.memory_budget else None
+        )
+    except KeyboardInterrupt:
+        return 0
+    print(f'{computed} res files computed, nothing new for {args.idle:g} s')
+    return 0
+
+
+def parse_args(argv: list=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='ANSYS CFX post-processing without GUI')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    inputs = argparse.ArgumentParser(add_help=False)
+    inputs.add_argument('-t', '--template', required=True, help='Template file (*.tmp)')
+    inputs.add_argument('-o', '--out', help='ANSYS out file the domains are read from')
+    inputs.add_argument('-r', '--res', nargs='+', default=[],
+        help='Result files, glob patterns or directories with *.res files')
+    inputs.add_argument('-d', '--output-dir', default='.', help='Directory for output.cse and csv files')
+    modes = inputs.add_mutually_exclusive_group()
+    modes.add_argument('-i', '--incremental', action='store_true',
+        help='Only compute res files missing or changed since the last run, append to output.csv')
+    modes.add_argument('-c', '--cache', action='store_true',
+        help='Only compute values missing in the result cache, see collect')
+    inputs.add_argument('--topology', action='store_true',
+        help='Run res files sharing a mesh (from their .out files) together, reloading and '
+        'initialising turbo only when the mesh changes')
+    inputs.add_argument('--groups', help='JSON file {group: [res files]} of files sharing a mesh, implies --topology')
+
+    gen = commands.add_parser('generate', parents=[inputs], help='Write output.cse from a template')
+    gen.set_defaults(func=generate)
+
+    batch = commands.add_parser('run', parents=[inputs],
+        help='Run the template on the res files in parallel CFD-Post sessions')
+    batch.add_argument('-j', '--workers', type=int, default=os.cpu_count(),
+        help='Number of CFD-Post sessions running at the same time')
+    batch.add_argument('--cfdpost', default='cfdpost', help='CFD-Post executable or command')
+    batch.add_argument('--memory-budget', type=float,
+        help='GB of res files the running sessions may hold at the same time')
+    batch.set_defaults(func=run)
+
+    join = commands.add_parser('collect', parents=[inputs],
+        help='Write output.csv from the result cache and results.tsv of a cached run')
+    join.set_defaults(func=collect)
+
+    cont = commands.add_parser('resume', help='Write output.cse that continues an interrupted generated run')
+    cont.add_argument('-d', '--output-dir', default='.', help='Directory of the interrupted run')
+    cont.set_defaults(func=resume)
+
+    store = commands.add_parser('ingest', help='Add the csv files of a run to the results store')
+    store.add_argument('-d', '--output-dir', default='.', help='Directory of the run')
+    store.add_argument('-t', '--template', help='Template of the run, its expressions give the template id')
+    store.add_argument('--run-id', help='Run id, default the hash of the csv file')
+    store.add_argument('--store', help='Results store directory')
+    store.add_argument('--parquet', action='store_true', help='Store Parquet files, needs pyarrow')
+    store.set_defaults(func=ingest)
+
+    conv = commands.add_parser('history', help='Write history.csv with the convergence of finished runs')
+    conv.add_argument('files', nargs='+', help='Out files, glob patterns or directories with *.out files, .gz, .xz and .zst as well')
+    conv.add_argument('-d', '--output-dir', default='.', help='Directory for history.csv')
+    conv.add_argument('--target', type=float, default=RESIDUAL_TARGET,
+        help='RMS residual every equation has to reach for convergence')
+    conv.add_argument('-j', '--workers', type=int, default=os.cpu_count(), help='Number of parsing processes')
+    conv.add_argument('--save', help='Directory for the residual, imbalance and monitor histories (.npz)')
+    conv.set_defaults(func=history)
+
+    walk = commands.add_parser('scan', help='Write campaign.json with the runs and domains below directories')
+    walk.add_argument('roots', nargs='+', help='Directories with *.out (also compressed) and *.res files in any depth')
+    walk.add_argument('-d', '--output-dir', default='.', help='Directory for campaign.json')
+    walk.add_argument('-j', '--workers', type=int, default=os.cpu_count(), help='Number of parsing processes')
+    walk.set_defaults(func=scan)
+
+    follow = commands.add_parser('watch', help='Append the rows of res files to output.csv as they appear')
+    follow.add_argument('directory', help='Directory the solver writes res files to')
+    follow.add_argument('-t', '--template', required=True, help='Template file (*.tmp)')
+    follow.add_argument('-o', '--out', help='ANSYS out file the domains are read from')
+    follow.add_argument('-d', '--output-dir', default='.', help='Directory for output.csv')
+    follow.add_argument('--interval', type=float, default=10.0, help='Seconds between two looks at the directory')
+    follow.add_argument('--settle', type=float, default=30.0,
+        help='Seconds a res file has to keep its size and mtime before it is computed')
+    follow.add_argument('--batch', type=int, default=20, help='Res files per CFD-Post run at most')
+    follow.add_argument('--recursive', action='store_true', help='Watch subdirectories as well')
+    follow.add_argument('--topology', action='store_true', help='Group the res files of a batch by mesh')
+    follow.add_argument('--idle', type=float, help='Stop after this many seconds without new res files')
+    follow.add_argument('-j', '--workers', type=int, default=os.cpu_count(),
+        help='Number of CFD-Post sessions running at the same time')
+    follow.add_argument('--cfdpost', default='cfdpost', help='CFD-Post executable or command')
+    follow.add_argument('--memory-budget', type=float,
+        help='GB of res files the running sessions may hold at the same time')
+    follow.set_defaults(func=watch_folder, res=[])
+
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    sys.exit(args.func(args))
@@ -0,0 +1,6 @@
+from PySide6.QtCore import Qt
+
+from utils.consts import *
+
+
+CS = [Qt.CheckState.Unchecked, Qt.CheckState.Checked]
@@ -10,7 +10,7 @@ from PySide6.QtGui import (
 
 
 from gui.gui import PushButton, GridLayout, Label
-from utils.consts import *
+from gui.consts import *
 
 
 class ExpressionCalc(QDialog):
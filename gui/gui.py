@@ -16,7 +16,7 @@ from PySide6.QtGui import (
     QCloseEvent, Qt
 )
 
-from utils.consts import *
+from gui.consts import *
 from utils.parse_out import *
 
 
@@ -1,14 +1,18 @@
+import os
 import json
 
 from PySide6.QtWidgets import (
     QMainWindow, QGridLayout, QWidget
 )
-from PySide6.QtCore import Slot, Qt
+from PySide6.QtCore import Slot, Qt, QThreadPool
 
 
-from utils.consts import *
+from gui.consts import *
 from utils.parse_out import *
+from utils.cache import DomainCache
+from utils.expressions import output_expressions
 from gui.gui import *
+from gui.workers import ParseWorker
 
 
 class MainWindow(QMainWindow):
@@ -36,6 +40,9 @@ class MainWindow(QMainWindow):
         self.file_save_directory = None
         self.inlet = None
         self.outlet = None
+        self.domain_cache = DomainCache()
+        self.pool = QThreadPool.globalInstance()
+        self.workers = []
 
         size = kwargs.get('size', [1280, 720])
         title = kwargs.get('title', '')
@@ -75,6 +82,7 @@ class MainWindow(QMainWindow):
         btn_size = [160, 32]
         btn_settings = [
             {'text': 'Load out file', 'size': btn_size},
+            {'text': 'Cancel loading', 'size': btn_size},
             {'text': 'Load template', 'size': btn_size},
             {'text': 'Save template', 'size': btn_size},
             {'text': 'Add res files', 'enable': False, 'size': btn_size},
@@ -86,19 +94,20 @@ class MainWindow(QMainWindow):
             buttons.append(PushButton(**btn))
 
         buttons[0].clicked.connect(
-            lambda: self.open_file(filter='Ansys out file (*.out)')
+            lambda: self.open_file(filter='Ansys out file (*.out *.out.gz *.out.xz *.out.zst)')
         )
-        buttons[1].clicked.connect(
+        buttons[1].clicked.connect(self.cancel_parsing)
+        buttons[2].clicked.connect(
             lambda: self.load_template_file(title="Load template", directory="\\", filter="Template file (*.tmp)")
         )
-        buttons[2].clicked.connect(
+        buttons[3].clicked.connect(
             lambda: self.save_template_as(title="Save template as", directory="\\", filter="Template files (*.tmp)")
         )
-        buttons[3].clicked.connect(
+        buttons[4].clicked.connect(
             lambda: self.open_files(ext='res', title='Add ANSYS result files', filter='ANSYS result files (*.res)')
         )
-        buttons[4].clicked.connect(lambda: self.open_directory(title="Save to Directory", directory="\\"))
-        buttons[5].clicked.connect(self.run)
+        buttons[5].clicked.connect(lambda: self.open_directory(title="Save to Directory", directory="\\"))
+        buttons[6].clicked.connect(self.run)
         qbtns = ButtonGroup(buttons=buttons)
         self.set_enabled(qbtns, True)
         return qbtns
@@ -107,17 +116,47 @@ class MainWindow(QMainWindow):
         instance.initialize()
 
     def get_domains(self):
-        try:
-            if self.out_file[0]:
-                self.domains = get_domains(outfile=self.out_file[0])
-            else:
-                msg = 'Out files have not been found.'
-                ex = 'Files Not Found'
-                diag = MessageBox(title=ex, information=msg)
-                diag.show()
-                diag.exec()
-        except FileNotFoundError as ex:
-            pass
+        if self.out_file[0]:
+            worker = ParseWorker(outfile=self.out_file[0], cache=self.domain_cache)
+            worker.signals.progress.connect(self.parsing_progress)
+            worker.signals.finished.connect(self.domains_parsed)
+            worker.signals.cancelled.connect(self.parsing_stopped)
+            worker.signals.error.connect(self.parsing_stopped)
+            self.workers.append(worker)
+            self.pool.start(worker)
+        else:
+            msg = 'Out files have not been found.'
+            ex = 'Files Not Found'
+            diag = MessageBox(title=ex, information=msg)
+            diag.show()
+            diag.exec()
+
+    def remove_worker(self, outfile: str) -> None:
+        self.workers = [w for w in self.workers if w.outfile != outfile]
+
+    @Slot()
+    def parsing_progress(self, outfile: str, scanned: int, total: int):
+        self.statusBar().showMessage(f'Loading {os.path.basename(outfile)}: {scanned * 100 // max(total, 1)}%')
+
+    @Slot()
+    def domains_parsed(self, outfile: str, domains: dict):
+        self.remove_worker(outfile)
+        self.domains = domains
+        self.tabs[0].update_tab(domains=self.domains)
+        self.statusBar().showMessage(f'Loaded {os.path.basename(outfile)}', 5000)
+
+    @Slot()
+    def parsing_stopped(self, outfile: str, error: str=None):
+        self.remove_worker(outfile)
+        if error:
+            self.statusBar().showMessage(f'Failed to load {os.path.basename(outfile)}: {error}', 5000)
+        else:
+            self.statusBar().showMessage(f'Loading {os.path.basename(outfile)} cancelled', 5000)
+
+    @Slot()
+    def cancel_parsing(self):
+        for worker in self.workers:
+            worker.cancel()
 
     @Slot()
     def set_enabled(self, buttons: QButtonGroup, enabled: bool=True):
@@ -143,7 +182,6 @@ class MainWindow(QMainWindow):
         self.out_file = open_file.open_file()
         if self.out_file[0]:
             self.get_domains()
-            self.tabs[0].update_tab(domains=self.domains)
 
     @Slot()
     def save_template_as(self, filter: str='', title: str='Save file as', directory='\\'):
@@ -205,6 +243,13 @@ class MainWindow(QMainWindow):
                     'add': True if self.tabs[0].expression_list.item(i).checkState() == Qt.CheckState.Checked else False
                 } for i in range(row)
             ]
+            try:
+                output_expressions(self.expressions)
+            except ValueError as ex:
+                diag = MessageBox(title='Invalid expressions', information=str(ex))
+                diag.show()
+                diag.exec()
+                return
         else:
             self.expressions = None
         self.domains = self.tabs[0].domains
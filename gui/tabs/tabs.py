@@ -4,7 +4,7 @@ from PySide6.QtWidgets import (
 from PySide6.QtCore import Qt, Slot, QRegularExpression
 
 
-from utils.consts import *
+from gui.consts import *
 from utils.parse_out import *
 from gui.gui import *
 from gui.tabs.widgets import *
@@ -2,7 +2,7 @@ from PySide6.QtWidgets import QWidget, QAbstractItemView
 from PySide6.QtCore import Slot
 
 
-from utils.consts import *
+from gui.consts import *
 from utils.parse_out import *
 from gui.gui import *
 from gui.expression_editor import ExpressionCalc
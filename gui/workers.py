@@ -0,0 +1,45 @@
+from PySide6.QtCore import QObject, QRunnable, Signal, Slot
+
+
+from utils.cache import DomainCache
+
+
+class ParseSignals(QObject):
+    progress = Signal(str, object, object)
+    finished = Signal(str, object)
+    cancelled = Signal(str)
+    error = Signal(str, str)
+
+
+class ParseWorker(QRunnable):
+    def __init__(self, outfile: str, cache: DomainCache):
+        super(ParseWorker, self).__init__()
+
+        self.outfile = outfile
+        self.cache = cache
+        self.signals = ParseSignals()
+        self.__cancelled = False
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self.__cancelled
+
+    def cancel(self) -> None:
+        self.__cancelled = True
+
+    @Slot()
+    def run(self) -> None:
+        try:
+            domains = self.cache.get_domains(
+                outfile=self.outfile,
+                progress=lambda scanned, total: self.signals.progress.emit(self.outfile, scanned, total),
+                cancelled=lambda: self.is_cancelled
+            )
+        except (OSError, ValueError) as ex:
+            self.signals.error.emit(self.outfile, str(ex))
+            return
+
+        if domains is None or self.is_cancelled:
+            self.signals.cancelled.emit(self.outfile)
+        else:
+            self.signals.finished.emit(self.outfile, domains)
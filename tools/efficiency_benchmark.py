@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import shutil
+import subprocess
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.cse_generator import CodeGenerator
+from utils.efficiency import comp_eff, comp_eff_scalar
+from utils.gas import gas_table
+
+
+# Vectorized comp_eff and the gas table inversion against the scalar
+# reference loop, and against the Perl subroutine of the session files
+# when perl is installed.
+
+POINTS = 100000
+PERL_POINTS = 1000
+TOLERANCE = 1e-9
+
+
+def operating_points(n: int, seed: int=0) -> tuple:
+    rng = np.random.default_rng(seed)
+    T1tot = rng.uniform(250, 320, n)
+    P1tot = rng.uniform(0.8e5, 1.2e5, n)
+    pi = rng.uniform(1.1, 12, n)
+    eff = rng.uniform(0.6, 0.92, n)
+    # Outlet temperature of a constant cp compression with that efficiency
+    T3tot = T1tot * (1 + (pi**(0.4/1.4) - 1) / eff)
+    return T1tot, T3tot, P1tot, P1tot * pi
+
+
+def perl_eff(points: tuple) -> np.ndarray:
+    lines = [' '.join(repr(float(x)) for x in p) for p in zip(*points)]
+    code = CodeGenerator().perl_eff_subroutine().replace('!\t', '').replace('\n!', '\n')
+    code += 'while (my $line = <STDIN>) { printf("%.17g\\n", comp_eff(split(/ /, $line))); }\n'
+    out = subprocess.run(['perl', '-e', code], input='\n'.join(lines) + '\n',
+        capture_output=True, text=True, check=True)
+    return np.array(out.stdout.split(), dtype=float)
+
+
+if __name__ == "__main__":
+    points = operating_points(POINTS)
+
+    t = time.perf_counter()
+    vectorized = comp_eff(*points)
+    t_vectorized = time.perf_counter() - t
+    t = time.perf_counter()
+    scalar = np.array([comp_eff_scalar(*p) for p in zip(*points)])
+    t_scalar = time.perf_counter() - t
+
+    t = time.perf_counter()
+    table = gas_table()
+    t_build = time.perf_counter() - t
+    t = time.perf_counter()
+    tabulated = table.comp_eff(*points)
+    t_table = time.perf_counter() - t
+
+    diff = np.max(np.abs(vectorized - scalar))
+    print(f'{POINTS} points: scalar {t_scalar:.3f} s, vectorized {t_vectorized:.4f} s, '
+        f'speed-up {t_scalar / t_vectorized:.0f}x, max difference {diff:.2e}')
+    # The Newton loop stops within 0.1 K, the table is exact after one step
+    table_diff = np.max(np.abs(tabulated - scalar))
+    print(f'gas table: built in {t_build:.4f} s, {t_table:.4f} s, speed-up {t_scalar / t_table:.0f}x, '
+        f'max difference {table_diff:.2e}')
+    ok = diff < TOLERANCE and table_diff < 1e-3
+
+    if shutil.which('perl'):
+        sample = tuple(x[:PERL_POINTS] for x in points)
+        perl_diff = np.max(np.abs(perl_eff(sample) - vectorized[:PERL_POINTS]))
+        print(f'{PERL_POINTS} points against Perl comp_eff: max difference {perl_diff:.2e}')
+        ok = ok and perl_diff < TOLERANCE
+    sys.exit(0 if ok else 1)
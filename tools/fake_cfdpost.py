@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import subprocess
+
+
+# Stand-in for "cfdpost -batch script.cse" on machines without ANSYS.
+# The ! lines of the session file are run by perl as they are, CCL and
+# action lines become calls of stubs: "> load" switches the current file,
+# the CFD-Post functions return values derived from the file name, the
+# function and its arguments. FAKE_CFDPOST_LOAD_TIME and
+# FAKE_CFDPOST_INIT_TIME (seconds) simulate the cost of "> load" and
+# "> turbo init", FAKE_CFDPOST_RESULTS_TIME the cost of a "> load"
+# without force_reload (default the load time), FAKE_CFDPOST_CRASH_AFTER=n
+# kills the session on the load after the n-th one.
+
+FUNCTIONS = [
+    'area', 'areaAve', 'areaInt', 'ave', 'massFlow', 'massFlowAve', 'massFlowInt',
+    'massFlowAveAbs', 'maxVal', 'minVal', 'sum', 'volume', 'volumeAve', 'volumeInt'
+]
+
+PRELUDE = r'''
+use Digest::MD5 qw(md5);
+use Time::HiRes qw(sleep);
+our $__file = '';
+our $__calls = 0;
+our $__loads = 0;
+sub __value {
+    $__calls++;
+    my $h = unpack('N', md5(join('|', $__file, @_))) / 4294967296;
+    return 300 + 100 * $h if $_[1] =~ /Temperature/;
+    return 100000 * (1 + $h) if $_[1] =~ /Pressure/;
+    return $h;
+}
+sub __action {
+    my $cmd = shift;
+    if ($cmd =~ /^load filename=([^,]+)/) {
+        $__file = $1;
+        exit(1) if ($ENV{FAKE_CFDPOST_CRASH_AFTER} && $__loads++ >= $ENV{FAKE_CFDPOST_CRASH_AFTER});
+        my $time = $cmd =~ /force_reload=true/ ? $ENV{FAKE_CFDPOST_LOAD_TIME} : $ENV{FAKE_CFDPOST_RESULTS_TIME} // $ENV{FAKE_CFDPOST_LOAD_TIME};
+        sleep($time || 0);
+    } elsif ($cmd =~ /^turbo init/) {
+        sleep($ENV{FAKE_CFDPOST_INIT_TIME} || 0);
+    }
+}
+sub __ccl { }
+END { print STDERR "fake cfdpost: $__calls function calls\n"; }
+'''
+
+
+def translate(cse: str) -> str:
+    stubs = ''.join(f'sub {f} {{ __value("{f}", @_) }}\n' for f in FUNCTIONS)
+    perl = [PRELUDE, stubs]
+    for line in cse.splitlines():
+        if line.startswith('!'):
+            perl.append(line[1:])
+        elif line.strip():
+            text = line.strip().replace('\\', '\\\\').replace('"', '\\"').replace('@', '\\@')
+            if text.startswith('>'):
+                perl.append(f'__action("{text[1:].strip()}");')
+            else:
+                perl.append(f'__ccl("{text}");')
+    return '\n'.join(perl) + '\n'
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) != 2 or args[0] != '-batch':
+        print('usage: fake_cfdpost.py -batch script.cse', file=sys.stderr)
+        sys.exit(2)
+
+    with open(args[1], 'r') as f:
+        perl = translate(f.read())
+    t = time.perf_counter()
+    proc = subprocess.run(['perl', '-'], input=perl, text=True)
+    print(f'fake cfdpost: {os.path.basename(args[1])} in {time.perf_counter() - t:.2f} s', file=sys.stderr)
+    sys.exit(proc.returncode)
@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.history import History, summarise
+
+
+# Writes synthetic .out files with residual tables and an imbalance
+# summary per domain, then times summarise() in one process and in a
+# process pool.
+
+EQUATIONS = ('U-Mom', 'V-Mom', 'W-Mom', 'P-Mass', 'H-Energy', 'K-TurbKE', 'O-TurbFreq')
+DOMAINS = ('R1', 'S1')
+SEPARATOR = ' +----------------------+------+---------+---------+------------------+\n'
+
+
+def out_text(iterations: int, seed: int) -> str:
+    rng = np.random.default_rng(seed)
+    rms = 1e-2 * np.exp(-np.arange(1, iterations + 1)[:, None] * rng.uniform(0.01, 0.03, len(EQUATIONS)))
+    lines = [' This run of the CFX Solver started\n']
+    for i in range(iterations):
+        lines.append(' ' + '=' * 70 + '\n')
+        lines.append(f' OUTER LOOP ITERATION = {i + 1:4d}                    CPU SECONDS = 1.234E+01\n')
+        lines.append(' ' + '-' * 70 + '\n')
+        lines.append(' |       Equation       | Rate | RMS Res | Max Res |  Linear Solution |\n')
+        lines.append(SEPARATOR)
+        for n, equation in enumerate(EQUATIONS):
+            lines.append(f' | {equation:<20} | 0.85 | {rms[i, n]:.1E} | {10 * rms[i, n]:.1E} |'
+                '       5.1E-02  OK|\n')
+        lines.append(SEPARATOR)
+    for domain in DOMAINS:
+        lines.append(f' | {"Domain Name : " + domain:^66} |\n')
+        lines.append(' |               Equation                |  Maximum Flow  |  Imbalance (%) |\n')
+        for equation in EQUATIONS:
+            lines.append(f' | {equation:^37} |   3.6470E-01   |    {rng.uniform(-0.1, 0.1):.4f}     |\n')
+    return ''.join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Convergence summary of many .out files')
+    parser.add_argument('-n', '--files', type=int, default=500)
+    parser.add_argument('-i', '--iterations', type=int, default=1000)
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        outfiles = []
+        for n in range(args.files):
+            outfiles.append(os.path.join(tmp, f'run_{n:04d}.out'))
+            with open(outfiles[-1], 'w') as f:
+                f.write(out_text(args.iterations, n))
+        size = sum(os.path.getsize(f) for f in outfiles) / 2**20
+
+        t = time.perf_counter()
+        serial = summarise(outfiles, workers=1)
+        t_serial = time.perf_counter() - t
+        t = time.perf_counter()
+        pooled = summarise(outfiles, workers=args.workers)
+        t_pooled = time.perf_counter() - t
+
+        save_dir = os.path.join(tmp, 'npz')
+        summarise(outfiles[:1], save_dir=save_dir)
+        loaded = History.load(os.path.join(save_dir, os.path.basename(outfiles[0]) + '.npz'))
+
+    converged = sum(s['converged'] is not None for s in serial)
+    print(f'{args.files} files, {size:.0f} MB: one process {t_serial:.2f} s, '
+        f'{args.workers} processes {t_pooled:.2f} s, {converged} converged')
+    imbalances = sum(key.endswith(' Imbalance') for key in serial[0])
+    ok = (serial == pooled and imbalances == len(DOMAINS) * len(EQUATIONS)
+        and loaded.summary() == {k: v for k, v in serial[0].items() if k != 'file'})
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,36 @@
+import os
+import sys
+import subprocess
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORE = ['utils.consts', 'utils.parse_out', 'utils.cache', 'utils.cse_generator', 'utils.script', 'utils.template', 'cli']
+LIMIT = 0.05
+RUNS = 10
+
+# Fresh interpreter per run: the interpreter start-up itself is not
+# counted, only the imports of the core modules.
+CODE = f"""
+import sys, time
+t = time.perf_counter()
+import {', '.join(CORE)}
+t = time.perf_counter() - t
+assert not any(m.startswith('PySide6') for m in sys.modules), 'core imports PySide6'
+assert 'numpy' not in sys.modules, 'core imports numpy'
+print(t)
+"""
+
+
+def import_time(runs: int=RUNS) -> float:
+    times = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', CODE], cwd=ROOT, check=True,
+            capture_output=True, text=True)
+        times.append(float(out.stdout))
+    return min(times)
+
+
+if __name__ == "__main__":
+    t = import_time()
+    print(f'core import: {t * 1000:.1f} ms (limit {LIMIT * 1000:.0f} ms)')
+    sys.exit(0 if t < LIMIT else 1)
@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from cli import expand_files, load_groups
+from utils.template import load_template
+from utils.script import gen_script, write_script, convert_path
+from utils.batch import run_cfdpost
+
+
+# Runs the expressions of a template on the same res files with a forced
+# reload of every file and in topology mode, and compares the session times.
+# FAKE_CFDPOST_* variables set the simulated costs of tools/fake_cfdpost.py.
+
+def session_time(cfdpost: str, output_dir: str, expressions: list, res_files: list, groups: dict) -> float:
+    code = gen_script(output_dir=convert_path(output_dir), expressions=expressions,
+        res_files=res_files, timings=True, groups=groups)
+    cse = os.path.join(output_dir, 'output.cse')
+    write_script(code=code, cse=cse)
+    t = time.perf_counter()
+    if run_cfdpost(cfdpost, cse):
+        raise RuntimeError(f'CFD-Post failed, see {os.path.join(output_dir, "cfdpost.log")}')
+    return time.perf_counter() - t
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Forced reload per file against topology mode')
+    parser.add_argument('-t', '--template', required=True)
+    parser.add_argument('-r', '--res', nargs='+', required=True)
+    parser.add_argument('--groups', help='JSON file {group: [res files]}, else the .out files are used')
+    parser.add_argument('--cfdpost', default='cfdpost')
+    args = parser.parse_args()
+    args.topology = True
+
+    expressions = load_template(args.template)['expressions']
+    res_files = expand_files(args.res)
+    if (groups := load_groups(args, res_files)) is None:
+        sys.exit(1)
+    if not groups:
+        print('No mesh groups, nothing to compare', file=sys.stderr)
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        reload = session_time(args.cfdpost, os.path.join(tmp, 'reload'), expressions, res_files, None)
+        topology = session_time(args.cfdpost, os.path.join(tmp, 'topology'), expressions, res_files, groups)
+    print(f'forced reload: {reload:.2f} s, topology: {topology:.2f} s, speed-up {reload / topology:.2f}x')
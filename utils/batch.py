@@ -0,0 +1,266 @@
+import os
+import csv
+import json
+import heapq
+import shlex
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.consts import LOAD_TIMES
+from utils.script import iter_script, write_script, convert_path, pm_work_list
+from utils.incremental import expressions_hash, prepare_incremental, read_manifest, MANIFEST
+from utils.result_cache import ResultCache, cached_values, collect_results, RESULTS
+from utils.expressions import output_expressions
+from utils.topology import group_files
+
+
+def file_sizes(files: list) -> list:
+    return [os.path.getsize(f) if os.path.exists(f) else 0 for f in files]
+
+
+def read_load_times(history: str=LOAD_TIMES) -> dict:
+    try:
+        with open(history, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def update_load_times(timings_csvs: list, history: str=LOAD_TIMES) -> None:
+    times = read_load_times(history)
+    for timings_csv in timings_csvs:
+        if os.path.exists(timings_csv):
+            with open(timings_csv, 'r', newline='') as f:
+                times.update((row[0], float(row[1])) for row in csv.reader(f) if len(row) == 2)
+    try:
+        os.makedirs(os.path.dirname(history), exist_ok=True)
+        with open(history, 'w') as f:
+            json.dump(times, f)
+    except OSError:
+        pass
+
+
+def file_weights(files: list, sizes: list, times: dict) -> list:
+    # Measured seconds where known, the others scaled from their size with
+    # the seconds per byte of the measured files. Sizes without history.
+    timed = [(times[f], s) for f, s in zip(files, sizes) if f in times]
+    if not timed:
+        return list(sizes)
+    rate = sum(t for t, _ in timed) / max(1, sum(s for _, s in timed))
+    return [times.get(f, s * rate) for f, s in zip(files, sizes)]
+
+
+def balance_files(weights: list, shards: int, sizes: list=None, memory_budget: int=None) -> list:
+    # Longest processing time first: the heaviest file goes to the least
+    # loaded shard. Files bigger than half the memory budget all go to one
+    # shard, so no two of them are loaded at the same time. Indices keep
+    # the original order inside every shard.
+    shards = max(1, min(shards, len(weights)))
+    huge = set()
+    if memory_budget and sizes:
+        huge = set(i for i, s in enumerate(sizes) if s > memory_budget / 2)
+
+    # Equal loads go to the shard with fewer files, zero weights included
+    indices = [[] for _ in range(shards)]
+    load = [(0, 0, n) for n in range(shards)]
+    if huge:
+        indices[0] = sorted(huge)
+        load[0] = (sum(weights[i] for i in huge), len(huge), 0)
+    heapq.heapify(load)
+    for i in sorted(set(range(len(weights))) - huge, key=lambda i: -weights[i]):
+        total, count, n = heapq.heappop(load)
+        indices[n].append(i)
+        heapq.heappush(load, (total + weights[i], count + 1, n))
+
+    return [sorted(s) for s in indices if s]
+
+
+class MemoryGate:
+    # Sessions start only while the files they hold at most fit into the
+    # budget together; a single session always starts.
+    def __init__(self, budget: int=None):
+        self.budget = budget
+        self.used = 0
+        self.running = 0
+        self.__condition = threading.Condition()
+
+    def acquire(self, amount: int) -> None:
+        with self.__condition:
+            self.__condition.wait_for(
+                lambda: not self.budget or not self.running or self.used + amount <= self.budget
+            )
+            self.used += amount
+            self.running += 1
+
+    def release(self, amount: int) -> None:
+        with self.__condition:
+            self.used -= amount
+            self.running -= 1
+            self.__condition.notify_all()
+
+
+def cfdpost_command(cfdpost: str, cse: str) -> list:
+    command = [cfdpost] if os.path.isfile(cfdpost) else shlex.split(cfdpost, posix=os.name != 'nt')
+    return command + ['-batch', cse]
+
+
+def run_cfdpost(cfdpost: str, cse: str, gate: MemoryGate=None, memory: int=0) -> int:
+    # Exit code of the session, None when cfdpost did not start, the error
+    # is in cfdpost.log then
+    directory = os.path.dirname(cse)
+    if gate:
+        gate.acquire(memory)
+    try:
+        with open(os.path.join(directory, 'cfdpost.log'), 'w') as log:
+            try:
+                proc = subprocess.run(cfdpost_command(cfdpost, cse), cwd=directory,
+                    stdout=log, stderr=subprocess.STDOUT)
+            except OSError as ex:
+                log.write(f'Cannot start {cfdpost}: {ex}\n')
+                return None
+    finally:
+        if gate:
+            gate.release(memory)
+    return proc.returncode
+
+
+def merge_csv(shard_dirs: list, shards: list, output_dir: str, append: bool=False) -> list:
+    # Row k of shard s belongs to the file shards[s][k], rows and their
+    # manifest lines are written in the order of the original file list.
+    # Returns indices without a row.
+    header = None
+    rows = {}
+    entries = {}
+    for shard_dir, indices in zip(shard_dirs, shards):
+        shard_csv = os.path.join(shard_dir, 'output.csv')
+        if not os.path.exists(shard_csv):
+            continue
+        lines = read_manifest(os.path.join(shard_dir, MANIFEST))
+        with open(shard_csv, 'r', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, header)
+            for k, (index, row) in enumerate(zip(indices, reader)):
+                rows[index] = row
+                if k < len(lines):
+                    entries[index] = lines[k]
+
+    with open(os.path.join(output_dir, 'output.csv'), 'a' if append else 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        if header and not append:
+            writer.writerow(header)
+        writer.writerows(rows[i] for i in sorted(rows))
+    with open(os.path.join(output_dir, MANIFEST), 'a' if append else 'w', newline='') as f:
+        f.writelines('\t'.join(entries[i]) + '\n' for i in sorted(entries))
+
+    return sorted(set(i for s in shards for i in s) - set(rows))
+
+
+def merge_performance_map(shard_dirs: list, shard_maps: list, items: list, output_dir: str,
+        domains: dict=None, groups: dict=None) -> list:
+    # A shard writes its rows in the pm_work_list order of its own map,
+    # they are written in the order of items. Returns items without a row.
+    order = {item[:2]: n for n, item in enumerate(items)}
+    header = None
+    rows = {}
+    for shard_dir, shard_map in zip(shard_dirs, shard_maps):
+        shard_csv = os.path.join(shard_dir, 'performance_map.csv')
+        if not shard_map or not os.path.exists(shard_csv):
+            continue
+        shard_items = [item for _, work in pm_work_list(shard_map, domains, groups) for item in work]
+        with open(shard_csv, 'r') as f:
+            header = next(f, header)
+            for item, line in zip(shard_items, f):
+                rows[order[item[:2]]] = line
+
+    if header:
+        with open(os.path.join(output_dir, 'performance_map.csv'), 'w') as f:
+            f.write(header)
+            f.writelines(rows[n] for n in sorted(rows))
+    return [item for n, item in enumerate(items) if n not in rows]
+
+
+def run_batch(output_dir: str, expressions: list, res_files: list, domains: list=None,
+        workers: int=None, cfdpost: str='cfdpost', memory_budget: int=None,
+        history: str=LOAD_TIMES, incremental: bool=False, cache: ResultCache=None,
+        groups: dict=None, performance_map: dict=None, report: callable=print) -> list:
+    # One CFD-Post session per shard, at most workers sessions at a time and
+    # within memory_budget bytes of res files. Shards are balanced on past
+    # load times or file sizes. Incremental runs only compute the files
+    # missing or stale in output.manifest and append their rows. With a
+    # result cache only uncached values are computed and output.csv is
+    # written from the cache. With groups the files of a mesh group are
+    # next to each other in every shard and output.csv. The (curve, res
+    # file) items of the performance map are balanced over the same
+    # sessions. Sessions that did not start or failed are reported with
+    # their shard. Returns the res files without a row.
+    workers = workers or os.cpu_count()
+    append = False
+    all_files = res_files
+    cached = None
+    exps, header = output_expressions(expressions)
+    items = [item for _, work in pm_work_list(performance_map or {}, domains, groups) for item in work]
+    if cache:
+        cached = cached_values(cache, res_files, exps, header)
+        res_files = [f for f in res_files if len(cached.get(f, {})) < len(header)]
+        if not res_files and not items:
+            return collect_results(cache, output_dir, all_files, exps, header=header)
+    elif incremental:
+        exp_hash = expressions_hash(exps, header)
+        res_files, append = prepare_incremental(output_dir, res_files, exp_hash)
+        if not res_files and not items:
+            return []
+    if groups:
+        # gen_script keeps this order, shard rows stay in the order merge_csv expects
+        res_files = group_files(res_files, groups)[0]
+    jobs = res_files + [item[1] for item in items]
+    sizes = file_sizes(jobs)
+    weights = file_weights(jobs, sizes, read_load_times(history))
+    shards = balance_files(weights, workers, sizes=sizes, memory_budget=memory_budget)
+    file_shards = [[i for i in indices if i < len(res_files)] for indices in shards]
+    shard_maps = []
+    for indices in shards:
+        shard_map = {}
+        for i in indices:
+            if i < len(res_files):
+                continue
+            curve, res_file, inlet, outlet = items[i - len(res_files)][:4]
+            shard_map.setdefault(curve, {'inlet': inlet, 'outlet': outlet, 'files': []})['files'].append(res_file)
+        shard_maps.append(shard_map)
+
+    cses = []
+    for n, (indices, shard_map) in enumerate(zip(file_shards, shard_maps)):
+        shard_dir = os.path.join(output_dir, 'batch', f'shard_{n:03d}')
+        code = iter_script(
+            output_dir=convert_path(shard_dir), expressions=expressions,
+            res_files=[res_files[i] for i in indices], domains=domains, timings=True,
+            manifest=True, cached=cached, groups=groups, performance_map=shard_map
+        )
+        cse = os.path.join(shard_dir, 'output.cse')
+        write_script(code=code, cse=cse)
+        for old in ('output.csv', 'timings.csv', 'performance_map.csv', MANIFEST, RESULTS):
+            if os.path.exists(old := os.path.join(shard_dir, old)):
+                os.remove(old)
+        cses.append(cse)
+
+    gate = MemoryGate(memory_budget)
+    memory = [max(sizes[i] for i in indices) for indices in shards]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        codes = list(pool.map(lambda job: run_cfdpost(cfdpost, job[0], gate=gate, memory=job[1]), zip(cses, memory)))
+    for cse, code in zip(cses, codes):
+        log = os.path.join(os.path.dirname(cse), 'cfdpost.log')
+        if code is None:
+            with open(log, 'r') as f:
+                report(f'{f.read().strip()}, see {log}')
+        elif code:
+            report(f'CFD-Post exited with code {code} in {os.path.dirname(cse)}, see {log}')
+
+    shard_dirs = [os.path.dirname(cse) for cse in cses]
+    update_load_times([os.path.join(d, 'timings.csv') for d in shard_dirs], history)
+    missing_items = merge_performance_map(shard_dirs, shard_maps, items, output_dir, domains, groups)
+    if cache:
+        missing = collect_results(cache, output_dir, all_files, exps,
+            [os.path.join(d, RESULTS) for d in shard_dirs], header=header)
+    else:
+        missing = [res_files[i] for i in merge_csv(shard_dirs, file_shards, output_dir, append=append)]
+    return list(dict.fromkeys(missing + [item[1] for item in missing_items]))
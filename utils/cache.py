@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+from utils.consts import CACHE_DIR, CACHE_SIZE
+from utils.parse_out import get_domains
+
+
+def file_key(path: str, chunk: int=65536) -> str:
+    # Path, size and mtime plus the head and the tail of the file: cheap to
+    # compute even for huge .out files and changes whenever the solver
+    # rewrites or appends to the file.
+    stat = os.stat(path)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f'{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}'.encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(chunk))
+        if stat.st_size > 2 * chunk:
+            f.seek(-chunk, os.SEEK_END)
+            digest.update(f.read(chunk))
+    return digest.hexdigest()
+
+
+class DomainCache:
+    def __init__(self, directory: str=CACHE_DIR, max_entries: int=CACHE_SIZE):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.index_file = os.path.join(directory, 'domains.json')
+        self.__entries = None
+        self.__lock = threading.RLock()
+
+    @property
+    def entries(self) -> dict:
+        if self.__entries is None:
+            try:
+                with open(self.index_file, 'r') as f:
+                    self.__entries = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                self.__entries = {}
+        return self.__entries
+
+    def get(self, outfile: str) -> dict:
+        key = file_key(outfile)
+        with self.__lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            entry['used'] = time.time()
+            self.save()
+            return entry['domains']
+
+    def get_many(self, outfiles: list) -> dict:
+        # {outfile: domains} of the cached files, one index write for all
+        found = {}
+        now = time.time()
+        with self.__lock:
+            for outfile in outfiles:
+                try:
+                    entry = self.entries.get(file_key(outfile))
+                except OSError:
+                    continue
+                if entry is not None:
+                    entry['used'] = now
+                    found[outfile] = entry['domains']
+            if found:
+                self.save()
+        return found
+
+    def put(self, outfile: str, domains: dict) -> None:
+        self.put_many({outfile: domains})
+
+    def put_many(self, domains: dict) -> None:
+        # domains: {outfile: domains}
+        with self.__lock:
+            keys = {e['path']: k for k, e in self.entries.items()}
+            for outfile, dmns in domains.items():
+                path = os.path.abspath(outfile)
+                # The entry of an older version of the same file will never be hit again
+                if (old := keys.get(path)) is not None:
+                    self.entries.pop(old, None)
+                keys[path] = key = file_key(outfile)
+                self.entries[key] = {'path': path, 'used': time.time(), 'domains': dmns}
+            if len(self.entries) > self.max_entries:
+                lru = sorted(self.entries, key=lambda k: self.entries[k]['used'])
+                for old in lru[:len(self.entries) - self.max_entries]:
+                    del self.entries[old]
+            self.save()
+
+    def save(self) -> None:
+        tmp = f'{self.index_file}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp, 'w') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp, self.index_file)
+        except OSError:
+            # The cache is an optimisation only, a read-only home is not an error
+            pass
+
+    def get_domains(self, outfile: str, **kwargs) -> dict:
+        # kwargs are passed to get_domains, a cancelled parse is not cached
+        domains = self.get(outfile)
+        if domains is None:
+            domains = get_domains(outfile=outfile, **kwargs)
+            if domains is not None:
+                self.put(outfile, domains)
+        return domains
@@ -0,0 +1,93 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.cache import DomainCache
+from utils.parse_out import get_domains, is_compressed, OUT_SUFFIXES
+
+
+def walk_files(roots: list, exts: tuple=tuple(s[1:] for s in OUT_SUFFIXES) + ('res',)) -> list:
+    # Paths of the files with one of exts below roots, depth first in
+    # name order. Symlinked directories are not followed.
+    suffixes = tuple(f'.{ext}' for ext in exts)
+    files = []
+    stack = [os.path.abspath(root) for root in reversed(roots)]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.name.endswith(suffixes) and entry.is_file():
+                    files.append(entry.path)
+            except OSError:
+                continue
+        stack += reversed(subdirs)
+    return files
+
+
+def pair_runs(files: list) -> dict:
+    # {path without extension: {'out': .out file, 'res': .res file}}, a
+    # missing half is None. A plain .out wins over a compressed one.
+    runs = {}
+    for path in files:
+        name = os.path.splitext(path)[0] if is_compressed(path) else path
+        stem, ext = os.path.splitext(name)
+        run = runs.setdefault(stem, {'out': None, 'res': None})
+        if ext == '.res':
+            run['res'] = path
+        elif run['out'] is None or is_compressed(run['out']) and not is_compressed(path):
+            run['out'] = path
+    return runs
+
+
+def _parse(outfile: str) -> tuple:
+    try:
+        return get_domains(outfile), None
+    except (OSError, ValueError) as ex:
+        return None, str(ex)
+
+
+def parse_domains(outfiles: list, cache: DomainCache=None, workers: int=None) -> tuple:
+    # ({outfile: domains}, {outfile: error}). Files missing in the cache
+    # are parsed in worker processes, the cache is written here only. The
+    # cache keeps at least every file of the campaign.
+    cache = cache or DomainCache()
+    cache.max_entries = max(cache.max_entries, len(outfiles))
+    domains = cache.get_many(outfiles)
+    missing = [f for f in outfiles if f not in domains]
+    if workers == 1 or len(missing) < 2:
+        parsed = [_parse(f) for f in missing]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = list(pool.map(_parse, missing,
+                chunksize=max(1, len(missing) // (4 * (workers or os.cpu_count())))))
+
+    new, errors = {}, {}
+    for outfile, (dmns, error) in zip(missing, parsed):
+        if error is None:
+            new[outfile] = dmns
+        else:
+            errors[outfile] = error
+    if new:
+        cache.put_many(new)
+    domains.update(new)
+    return domains, errors
+
+
+def scan_campaign(roots: list, cache: DomainCache=None, workers: int=None) -> dict:
+    # {run: {'out', 'res', 'domains', 'error'}} of every .out/.res pair
+    # below roots, run is the path without extension. Runs without a .out
+    # have no domains.
+    runs = pair_runs(walk_files(roots))
+    outfiles = [run['out'] for run in runs.values() if run['out']]
+    domains, errors = parse_domains(outfiles, cache, workers)
+    for run in runs.values():
+        run['domains'] = domains.get(run['out'])
+        run['error'] = errors.get(run['out'])
+    return runs
@@ -0,0 +1,45 @@
+import os
+import json
+
+
+CHECKPOINT = 'output.checkpoint'
+RUN_STATE = 'run_state.json'
+
+
+def save_run_state(output_dir: str, **state) -> None:
+    # Everything gen_script needs to write the session file again
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, RUN_STATE), 'w') as f:
+        json.dump(state, f, indent=1)
+
+
+def load_run_state(output_dir: str) -> dict:
+    with open(os.path.join(output_dir, RUN_STATE), 'r') as f:
+        return json.load(f)
+
+
+def read_checkpoint(output_dir: str) -> dict:
+    # {'files': [...], 'curves': {curve: [...]}} finished so far, in order
+    done = {'files': [], 'curves': {}}
+    checkpoint = os.path.join(output_dir, CHECKPOINT)
+    if not os.path.exists(checkpoint):
+        return done
+    with open(checkpoint, 'r') as f:
+        for line in f:
+            entry = line.rstrip('\r\n').split('\t')
+            if entry[0] == 'expr' and len(entry) == 2:
+                done['files'].append(entry[1])
+            elif entry[0] == 'pm' and len(entry) == 3:
+                done['curves'].setdefault(entry[1], []).append(entry[2])
+    return done
+
+
+def trim_csv(csv_file: str, rows: int) -> None:
+    # Keeps the header and the first rows lines: a row written right before
+    # the crash has no checkpoint entry and will be computed again
+    if not os.path.exists(csv_file):
+        return
+    with open(csv_file, 'r') as f:
+        lines = f.readlines()[:rows + 1]
+    with open(csv_file, 'w') as f:
+        f.writelines(lines)
@@ -1,5 +1,4 @@
 import os
-from PySide6.QtCore import Qt
 
 FONT = ['Calibri', 14]
 MSG_FONT = ['Calibri', 12]
@@ -29,4 +28,12 @@ TURBO_KEYS = [
 
 HERE = os.path.dirname(__file__)
 
-CS = [Qt.CheckState.Unchecked, Qt.CheckState.Checked]
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.ansys_post')
+CACHE_SIZE = 256
+LOAD_TIMES = os.path.join(CACHE_DIR, 'load_times.json')
+RESULTS_CACHE = os.path.join(CACHE_DIR, 'results')
+STORE_DIR = os.path.join(CACHE_DIR, 'store')
+# Longer file lists go to a side file the session reads line by line
+LIST_THRESHOLD = 1000
+# CFX default residual target (RMS)
+RESIDUAL_TARGET = 1e-4
@@ -1,3 +1,4 @@
+from utils.expressions import hoist_calls
 
 
 class CodeGenerator:
@@ -8,8 +9,10 @@ class CodeGenerator:
     def code(self):
         return self.__code
 
-    def gen_init(self, domains: list=None) -> str:
-        out = '!\tuse Math::Trig;\n!\tuse File::Basename;\n!\tuse File::Spec;\n!\tuse warnings;\n\n'
+    def gen_init(self, domains: list=None, modules: list=None) -> str:
+        out = '!\tuse Math::Trig;\n!\tuse File::Basename;\n!\tuse File::Spec;\n!\tuse warnings;\n'
+        out += '' if not modules else ''.join(f'!\tuse {m};\n' for m in modules)
+        out += '\n'
         out += '' if not domains else 'DATA READER:\n\tDomains to Load = '
         out += '' if not domains else str(domains)[1:-1].replace("'", '') + '\n'
         out += '' if not domains else 'END\n\n'
@@ -27,6 +30,19 @@ class CodeGenerator:
     def turbo_init(self) -> str:
         return f'> update\n> turbo init\n> turbo more_vars\n'
 
+    def load_group_file(self, filename: str='$f', groups_var: str='groups', index: str='i',
+            group_var: str='group') -> str:
+        # Forced reload and turbo init only for the first file of a mesh
+        # group, the next ones only replace the results
+        out = f'!\tif (${groups_var}[${index}] != ${group_var}) {{\n'
+        out += self.load_file(filename=filename)
+        out += self.turbo_init()
+        out += f'!\t${group_var} = ${groups_var}[${index}];\n'
+        out += '!\t} else {\n'
+        out += f'> load filename={filename}\n'
+        out += '!\t};\n'
+        return out
+
     def domain_turbo_init(case, domain) -> str:
         out = 'DATA READER:\n'
         out += f'\tDOMAINS:{domain}\n'
@@ -43,19 +59,87 @@ class CodeGenerator:
             out += str(variables)[1:-1].replace("'", '') + ");\n"
         return out
 
-    def gen_perl_expressions(self, expressions: list) -> str:
+    def gen_perl_read_list(self, filename: str, varnames: list, filevar: str='LH') -> str:
+        # Parallel arrays from the tab separated columns of filename
+        out = f'!\tmy ({", ".join("@" + v for v in varnames)});\n'
+        out += f'!\topen (my ${filevar}, \'<\', "{filename}") or die;\n'
+        out += f'!\twhile (my $line = <${filevar}>) {{\n'
+        out += '!\t\tchomp $line;\n'
+        out += '!\t\tmy @fields = split(/\\t/, $line, -1);\n'
+        out += ''.join(f'!\t\tpush @{v}, $fields[{n}];\n' for n, v in enumerate(varnames))
+        out += '!\t};\n'
+        out += f'!\tclose(${filevar});\n'
+        return out
+
+    def gen_perl_read_hash(self, filename: str, varname: str='cache', filevar: str='LH') -> str:
+        # Hash of hashes from the key, name and value columns of filename
+        out = f'!\tmy %{varname};\n'
+        out += f'!\topen (my ${filevar}, \'<\', "{filename}") or die;\n'
+        out += f'!\twhile (my $line = <${filevar}>) {{\n'
+        out += '!\t\tchomp $line;\n'
+        out += '!\t\tmy ($key, $name, $value) = split(/\\t/, $line, -1);\n'
+        out += f'!\t\t${varname}{{$key}}{{$name}} = $value;\n'
+        out += '!\t};\n'
+        out += f'!\tclose(${filevar});\n'
+        return out
+
+    def gen_perl_expressions(self, expressions: list, cached: dict=None, cache_var: str='cache',
+            filename: str='$f', hoist: bool=False) -> str:
+        # cached: {var: True if every file has a cached value, False if some do}.
+        # Cached values are taken from %cache_var instead of being computed.
+        # With hoist repeated function calls are computed once per file.
+        cached = {} if not cached else cached
         out = ''
+        if hoist:
+            expressions, temporaries, _ = hoist_calls(expressions)
+            out += '' if not temporaries else f'!\tmy ({", ".join(temporaries)});\n'
         for exp in expressions:
-            out += f'!\tmy {exp};\n'
+            var, rhs = (e.strip() for e in exp.split('=', 1))
+            value = f'${cache_var}{{{filename}}}{{\'{var.lstrip("$")}\'}}'
+            if var.lstrip('$') not in cached:
+                out += f'!\tmy {exp};\n'
+            elif cached[var.lstrip('$')]:
+                out += f'!\tmy {var} = {value};\n'
+            else:
+                out += f'!\tmy {var} = exists {value} ? {value} : ({rhs});\n'
+        return out
+
+    def gen_perl_hash(self, values: dict, varname: str='cache') -> str:
+        # {key: {name: number}} as a Perl hash of hashes
+        out = f'!\tmy %{varname} = (\n'
+        for key, items in values.items():
+            key = key.replace('\\', '\\\\').replace("'", "\\'")
+            row = ', '.join(f"'{k}' => {v!r}" for k, v in items.items())
+            out += f"!\t\t'{key}' => {{{row}}},\n"
+        out += '!\t);\n'
         return out
 
+    def gen_perl_if(self, code: str, condition: str) -> str:
+        out = f'!\tif ({condition}) ' + '{\n'
+        out += code
+        out += '!\t};\n'
+        return out
+
+    def gen_perl_block(self, code: str) -> str:
+        # Own scope for the my variables of code
+        return '!\t{\n' + code + '!\t};\n'
+
     def gen_perl_loop(self, code: str, array_var: str, arr_name: str='f') -> str:
         out = f'!\tfor my ${arr_name} (@{array_var}) ' + '{\n'
         out += code
         out += '!\t};\n'
         return out
 
-    def gen_perl_open_file(self, filename: str, filevar='FH', open_as: str='>') -> str:
+    def gen_perl_index_loop(self, code: str, array_var: str, arr_name: str='f', index: str='i') -> str:
+        out = f'!\tfor my ${index} (0..$#{array_var}) ' + '{\n'
+        out += f'!\tmy ${arr_name} = ${array_var}[${index}];\n'
+        out += code
+        out += '!\t};\n'
+        return out
+
+    def gen_perl_open_file(self, filename: str, filevar='FH', open_as: str='>', append_var: str=None) -> str:
+        if append_var:
+            return f'!\topen (my ${filevar}, (${append_var} ? \'>>\' : \'>\'), "{filename}") or die;\n'
         return F'!\topen (my ${filevar}, \'{open_as}\', "{filename}") or die;\n'
     
     def write_to_file(self, code: str, filevar: str='FH') -> str:
@@ -64,18 +148,48 @@ class CodeGenerator:
     def gen_perl_close_file(self, filevar: str='FH') -> str:
         return f'!\tclose(${filevar});\n'
 
-    def pm_expressions(self, curve: str, inlet: str, outlet: str):
-        out = f'!\tmy $massFlow = massFlow("{inlet}");\n'
-        out += f'!\tmy $T1tot = massFlowAve("Total Temperature in Stn Frame","{inlet}");\n'
-        out += f'!\tmy $T3tot = massFlowAve("Total Temperature in Stn Frame","{outlet}");\n'
-        out += f'!\tmy $P1tot = massFlowAve("Total Pressure in Stn Frame","{inlet}");\n'
-        out += f'!\tmy $P3tot = massFlowAve("Total Pressure in Stn Frame","{outlet}");\n'
-        out += f'!\tmy $P3st = areaAve("Pressure", "{outlet}");\n'
-        out += '!\tmy Pist = $P3st / $P1tot;\n'
-        out += '!\tmy Pitt = $P3tot / $P1tot;\n'
-        out += f'!\tmy $eff = comp_eff($T1tot, $T3tot, $P1tot, $P3tot);\n'
+    def gen_perl_autoflush(self, filevar: str='FH') -> str:
+        return f'!\tselect((select(${filevar}), $| = 1)[0]);\n'
+
+    def gen_perl_manifest(self, filename: str, exp_hash: str, varname: str='done', append_var: str='append') -> str:
+        # Files already in the manifest for this expression set, by size and
+        # mtime. Output is appended only if there are any.
+        out = f'!\tmy %{varname};\n'
+        out += f'!\tif (open (my $IN, \'<\', "{filename}")) {{\n'
+        out += '!\t\twhile (my $line = <$IN>) {\n'
+        out += '!\t\t\tchomp $line;\n'
+        out += '!\t\t\tmy ($path, $size, $mtime, $hash) = split(/\\t/, $line);\n'
+        out += f'!\t\t\t${varname}{{$path}} = "$size\\t$mtime" if ($hash eq \'{exp_hash}\');\n'
+        out += '!\t\t};\n'
+        out += '!\t\tclose($IN);\n'
+        out += '!\t};\n'
+        out += f'!\tmy ${append_var} = %{varname} ? 1 : 0;\n'
+        return out
+
+    def gen_perl_skip_done(self, filename: str='$f', varname: str='done') -> str:
+        out = f'!\tmy @st = stat({filename});\n'
+        out += f'!\tnext if (exists ${varname}{{{filename}}} && ${varname}{{{filename}}} eq "$st[7]\\t$st[9]");\n'
         return out
 
+    def write_manifest_entry(self, exp_hash: str, filename: str='$f', filevar: str='MH') -> str:
+        return self.write_to_file(code=f'"%s\\t%d\\t%d\\t%s\\n", {filename}, $st[7], $st[9], \'{exp_hash}\'', filevar=filevar)
+
+    def pm_expression_list(self, inlet: str, outlet: str) -> list:
+        return [
+            f'$massFlow = massFlow("{inlet}")',
+            f'$T1tot = massFlowAve("Total Temperature in Stn Frame","{inlet}")',
+            f'$T3tot = massFlowAve("Total Temperature in Stn Frame","{outlet}")',
+            f'$P1tot = massFlowAve("Total Pressure in Stn Frame","{inlet}")',
+            f'$P3tot = massFlowAve("Total Pressure in Stn Frame","{outlet}")',
+            f'$P3st = areaAve("Pressure", "{outlet}")',
+            '$Pist = $P3st / $P1tot',
+            '$Pitt = $P3tot / $P1tot',
+            '$eff = comp_eff($T1tot, $T3tot, $P1tot, $P3tot)'
+        ]
+
+    def pm_expressions(self, curve: str, inlet: str, outlet: str, hoist: bool=False):
+        return self.gen_perl_expressions(expressions=self.pm_expression_list(inlet=inlet, outlet=outlet), hoist=hoist)
+
     def perl_eff_subroutine(self):
         out = """
 !\tsub comp_eff
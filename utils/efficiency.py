@@ -0,0 +1,86 @@
+import csv
+import math
+
+import numpy as np
+
+
+# cp/R = a1 + a2*T + a3*T**2 + a4*T**3 + a5*T**4, the coefficients and the
+# tolerance (K) of comp_eff in CodeGenerator.perl_eff_subroutine
+COEFFICIENTS = (3.5683962, -0.000678729429, 0.00000155371476, -3.2993706e-12, -4.66395387e-13)
+TOLERANCE = 0.1
+MAX_ITERATIONS = 100
+
+
+def enthalpy(T, a: tuple=COEFFICIENTS):
+    # h/R without the constant of integration
+    return a[0]*T + a[1]*T**2/2 + a[2]*T**3/3 + a[3]*T**4/4 + a[4]*T**5/5
+
+
+def entropy_function(T, a: tuple=COEFFICIENTS):
+    # Integral of cp/(R*T) dT
+    return a[0]*np.log(T) + a[1]*T + a[2]*T**2/2 + a[3]*T**3/3 + a[4]*T**4/4
+
+
+def cp_over_rt(T, a: tuple=COEFFICIENTS):
+    return a[0]/T + a[1] + a[2]*T + a[3]*T**2 + a[4]*T**3
+
+
+def isentropic_temperature(T1tot, T3tot, P1tot, P3tot, a: tuple=COEFFICIENTS,
+        tol: float=TOLERANCE, max_iterations: int=MAX_ITERATIONS) -> np.ndarray:
+    # Newton steps on all points at once from T3tot, a point stops once its
+    # step is within tol. Points that do not converge are nan.
+    T1tot, T3tot, P1tot, P3tot = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (T1tot, T3tot, P1tot, P3tot)))
+    target = entropy_function(T1tot, a) + np.log(P3tot / P1tot)
+    T = T3tot.copy()
+    active = np.ones(T.shape, dtype=bool)
+    for _ in range(max_iterations):
+        Ta = T[active]
+        step = (entropy_function(Ta, a) - target[active]) / cp_over_rt(Ta, a)
+        T[active] = Ta - step
+        active[active] = ~(np.abs(step) <= tol)
+        if not active.any():
+            break
+    T[active] = np.nan
+    return T
+
+
+def comp_eff(T1tot, T3tot, P1tot, P3tot, a: tuple=COEFFICIENTS, tol: float=TOLERANCE,
+        max_iterations: int=MAX_ITERATIONS) -> np.ndarray:
+    # Isentropic compression efficiency of every point, as comp_eff in Perl
+    T1tot, T3tot = np.asarray(T1tot, dtype=float), np.asarray(T3tot, dtype=float)
+    T3_iz = isentropic_temperature(T1tot, T3tot, P1tot, P3tot, a, tol, max_iterations)
+    h1 = enthalpy(T1tot, a)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (enthalpy(T3_iz, a) - h1) / (enthalpy(T3tot, a) - h1)
+
+
+def comp_eff_scalar(T1tot: float, T3tot: float, P1tot: float, P3tot: float,
+        a: tuple=COEFFICIENTS, tol: float=TOLERANCE) -> float:
+    # Reference loop with the steps of the Perl subroutine
+    pi = P3tot / P1tot
+    c1 = a[0]*T1tot + a[1]*T1tot**2/2 + a[2]*T1tot**3/3 + a[3]*T1tot**4/4 + a[4]*T1tot**5/5
+    c2 = a[0]*T3tot + a[1]*T3tot**2/2 + a[2]*T3tot**3/3 + a[3]*T3tot**4/4 + a[4]*T3tot**5/5
+    s1 = a[0]*math.log(T1tot) + a[1]*T1tot + a[2]*T1tot**2/2 + a[3]*T1tot**3/3 + a[4]*T1tot**4/4
+    T3_iz = T3tot
+    T3_iz_prev = T3_iz + 100
+    while abs(T3_iz - T3_iz_prev) > tol:
+        T3_iz_prev = T3_iz
+        f1 = a[0]/T3_iz + a[1] + a[2]*T3_iz + a[3]*T3_iz**2 + a[4]*T3_iz**3
+        f2 = (a[0]*math.log(T3_iz) + a[1]*T3_iz + a[2]*T3_iz**2/2 + a[3]*T3_iz**3/3
+            + a[4]*T3_iz**4/4) - s1 - math.log(pi)
+        T3_iz = T3_iz - f2/f1
+    c2_iz = a[0]*T3_iz + a[1]*T3_iz**2/2 + a[2]*T3_iz**3/3 + a[3]*T3_iz**4/4 + a[4]*T3_iz**5/5
+    return (c2_iz - c1)/(c2 - c1)
+
+
+def read_stations(performance_map_csv: str) -> dict:
+    # {'T1tot': array, 'T3tot': ..., 'P1tot': ..., 'P3tot': ...} from the
+    # columns gen_script writes to performance_map.csv
+    names = ('T1tot', 'T3tot', 'P1tot', 'P3tot')
+    with open(performance_map_csv, 'r', newline='') as f:
+        reader = csv.reader(f, skipinitialspace=True)
+        header = next(reader)
+        columns = [header.index(name) for name in names]
+        rows = [[float(row[c]) for c in columns] for row in reader if len(row) == len(header)]
+    values = np.array(rows, dtype=float).reshape(-1, len(names))
+    return dict(zip(names, values.T))
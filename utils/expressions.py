@@ -0,0 +1,186 @@
+import re
+import heapq
+import hashlib
+
+from utils.consts import FUNCTION_KEYS
+
+
+VAR_PATTERN = re.compile(r'\$(\w+)')
+STRING_PATTERN = re.compile(r'("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')')
+
+
+def split_expression(expression: str) -> tuple:
+    # '$var = rhs' -> ('var', 'rhs')
+    var, rhs = expression.split('=', 1)
+    return var.strip().lstrip('$'), rhs.strip()
+
+
+def normalize(rhs: str) -> str:
+    # Whitespace outside of string literals does not change the value,
+    # single and double quoted strings are the same literal
+    parts = STRING_PATTERN.split(rhs)
+    for i, part in enumerate(parts):
+        if i % 2:
+            parts[i] = '"' + part[1:-1] + '"'
+        else:
+            parts[i] = re.sub(r'\s+', '', part)
+    return ''.join(parts)
+
+
+def references(rhs: str) -> list:
+    # Variables used by rhs, string literals excluded
+    code = ''.join(p for i, p in enumerate(STRING_PATTERN.split(rhs)) if not i % 2)
+    return list(dict.fromkeys(VAR_PATTERN.findall(code)))
+
+
+def expression_hashes(expressions: list) -> dict:
+    # {var: hash of its normalized rhs and the hashes of the variables it
+    # uses}, editing an expression changes the hash of everything computed
+    # from it.
+    hashes = {}
+    for expression in expressions:
+        var, rhs = split_expression(expression)
+        digest = hashlib.sha1(normalize(rhs).encode())
+        for ref in references(rhs):
+            digest.update(f'|{ref}={hashes.get(ref, ref)}'.encode())
+        hashes[var] = digest.hexdigest()[:20]
+    return hashes
+
+
+def call_pattern(functions: list=FUNCTION_KEYS) -> re.Pattern:
+    # CFD-Post function calls whose arguments are all string literals
+    string = r'(?:"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')'
+    return re.compile(
+        r'(?<![\w$])(' + '|'.join(sorted(functions, key=len, reverse=True)) + r')\s*\(\s*('
+        + string + r'(?:\s*,\s*' + string + r')*)\s*\)'
+    )
+
+
+CALL_PATTERN = call_pattern()
+ANY_CALL_PATTERN = re.compile(
+    r'(?<![\w$])(?:' + '|'.join(sorted(FUNCTION_KEYS, key=len, reverse=True)) + r')\s*\('
+)
+IDENTIFIER_CALL_PATTERN = re.compile(r'(?<![\w$@%&])([A-Za-z_]\w*)\s*\(')
+# Calls that take no location: Perl numeric builtins and the subroutines
+# of the generated session
+PERL_FUNCTIONS = {'abs', 'atan2', 'cos', 'exp', 'int', 'log', 'sin', 'sqrt', 'defined', 'comp_eff'}
+
+
+def hoist_calls(expressions: list, prefix: str='_cse') -> tuple:
+    # Common subexpression elimination over '$var = rhs' expressions: every
+    # call used more than once becomes a temporary that is computed the
+    # first time it is needed. Returns (expressions, {temporary: call},
+    # number of calls saved).
+    calls = {}
+    for expression in expressions:
+        for match in CALL_PATTERN.finditer(expression.split('=', 1)[1]):
+            key = normalize(match.group(0))
+            calls[key] = calls.get(key, 0) + 1
+
+    temporaries = {}
+    names = {}
+    for key, count in calls.items():
+        if count > 1:
+            names[key] = f'${prefix}{len(names) + 1}'
+            temporaries[names[key]] = key
+
+    def replace(match: re.Match) -> str:
+        name = names.get(normalize(match.group(0)))
+        if not name:
+            return match.group(0)
+        return f'(defined {name} ? {name} : ({name} = {temporaries[name]}))'
+
+    hoisted = []
+    for expression in expressions:
+        var, rhs = expression.split('=', 1)
+        hoisted.append(f'{var}={CALL_PATTERN.sub(replace, rhs)}')
+    saved = sum(count - 1 for count in calls.values() if count > 1)
+    return hoisted, temporaries, saved
+
+
+def expression_domains(expressions: list, domains: dict) -> list:
+    # Domains the calls of the '$var = rhs' expressions are evaluated on,
+    # the location is the last argument and a boundary or a domain name of
+    # the get_domains dictionary. Every domain when a location is unknown
+    # or not a string literal, or the rhs calls any other function, whose
+    # location is not known.
+    owner = {}
+    for domain, boundaries in domains.items():
+        owner[domain] = domain
+        for boundary in boundaries:
+            owner.setdefault(boundary, domain)
+
+    used = set()
+    for expression in expressions:
+        rhs = split_expression(expression)[1]
+        calls = list(CALL_PATTERN.finditer(rhs))
+        if len(calls) != len(ANY_CALL_PATTERN.findall(rhs)):
+            return list(domains)
+        code = ''.join(p for i, p in enumerate(STRING_PATTERN.split(rhs)) if not i % 2)
+        if any(name not in FUNCTION_KEYS and name not in PERL_FUNCTIONS
+                for name in IDENTIFIER_CALL_PATTERN.findall(code)):
+            return list(domains)
+        for call in calls:
+            location = STRING_PATTERN.findall(call.group(2))[-1][1:-1]
+            if location not in owner:
+                return list(domains)
+            used.add(owner[location])
+    return [d for d in domains if d in used] if used else list(domains)
+
+
+def dependency_order(expressions: list, outputs: list=None, known: tuple=('f',)) -> list:
+    # '$var = rhs' expressions ordered so every variable is defined before
+    # it is used, without the expressions no output depends on. outputs
+    # defaults to every variable, known are variables the loop defines.
+    # Raises ValueError on duplicate definitions, undefined variables and
+    # cycles among the needed expressions.
+    definitions = {}
+    for i, expression in enumerate(expressions):
+        var, rhs = split_expression(expression)
+        if var in definitions:
+            raise ValueError(f'${var} is defined more than once')
+        definitions[var] = (i, [r for r in references(rhs) if r not in known])
+    outputs = list(definitions) if outputs is None else outputs
+
+    needed = set()
+    stack = list(outputs)
+    while stack:
+        var = stack.pop()
+        if var in needed:
+            continue
+        if var not in definitions:
+            raise ValueError(f'${var} is not defined')
+        needed.add(var)
+        for ref in definitions[var][1]:
+            if ref not in definitions:
+                raise ValueError(f'${ref} used by ${var} is not defined')
+            stack.append(ref)
+
+    # Kahn's algorithm, ready expressions are taken in their list order
+    waiting = {var: set(definitions[var][1]) for var in needed}
+    users = {var: [] for var in needed}
+    for var, refs in waiting.items():
+        for ref in refs:
+            users[ref].append(var)
+    ready = [(definitions[var][0], var) for var, refs in waiting.items() if not refs]
+    heapq.heapify(ready)
+    order = []
+    while ready:
+        i, var = heapq.heappop(ready)
+        order.append(expressions[i])
+        for user in users[var]:
+            waiting[user].discard(var)
+            if not waiting[user]:
+                heapq.heappush(ready, (definitions[user][0], user))
+    if len(order) < len(needed):
+        cycle = sorted((v for v, refs in waiting.items() if refs), key=lambda v: definitions[v][0])
+        raise ValueError('Cyclic dependency between ' + ', '.join(f'${v}' for v in cycle))
+    return order
+
+
+def output_expressions(expressions: list) -> tuple:
+    # (ordered '$var = rhs' expressions to compute, checked variables) from
+    # dicts with 'expression' and 'add' keys as MainWindow.run collects them
+    exps = [e['expression'] for e in expressions]
+    header = [split_expression(e['expression'])[0] for e in expressions if e.get('add', True)]
+    return dependency_order(exps, outputs=header), header
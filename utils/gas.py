@@ -0,0 +1,63 @@
+from functools import lru_cache
+
+import numpy as np
+
+from utils.efficiency import COEFFICIENTS, enthalpy, entropy_function, cp_over_rt
+
+
+T_MIN = 150.0
+T_MAX = 1500.0
+T_STEP = 0.5
+
+
+class GasTable:
+    # Enthalpy h/R and entropy function phi/R tabulated on a temperature
+    # grid, both grow with T so the inverse is an interpolation as well.
+    # Values outside the grid are nan.
+    def __init__(self, a: tuple=COEFFICIENTS, t_min: float=T_MIN, t_max: float=T_MAX, step: float=T_STEP):
+        self.a = tuple(a)
+        self.T = np.arange(t_min, t_max + step / 2, step)
+        self.h = enthalpy(self.T, self.a)
+        self.phi = entropy_function(self.T, self.a)
+        if np.any(cp_over_rt(self.T, self.a) <= 0):
+            raise ValueError('cp is not positive on the table range')
+
+    def enthalpy(self, T):
+        return np.interp(T, self.T, self.h, left=np.nan, right=np.nan)
+
+    def entropy_function(self, T):
+        return np.interp(T, self.T, self.phi, left=np.nan, right=np.nan)
+
+    def temperature_from_enthalpy(self, h):
+        return np.interp(h, self.h, self.T, left=np.nan, right=np.nan)
+
+    def temperature_from_entropy(self, phi):
+        return np.interp(phi, self.phi, self.T, left=np.nan, right=np.nan)
+
+    def isentropic_temperature(self, T1tot, P1tot, P3tot, refine: bool=True):
+        # phi(T3_iz) = phi(T1tot) + ln(P3tot/P1tot) by table inversion. One
+        # Newton step on the exact polynomials removes the interpolation
+        # error (about 1e-4 K on the default grid).
+        T1tot = np.asarray(T1tot, dtype=float)
+        target = entropy_function(T1tot, self.a) + np.log(np.asarray(P3tot, dtype=float) / P1tot)
+        T = self.temperature_from_entropy(target)
+        if refine:
+            T = T - (entropy_function(T, self.a) - target) / cp_over_rt(T, self.a)
+        return T
+
+    def comp_eff(self, T1tot, T3tot, P1tot, P3tot, refine: bool=True):
+        T1tot, T3tot = np.asarray(T1tot, dtype=float), np.asarray(T3tot, dtype=float)
+        T3_iz = self.isentropic_temperature(T1tot, P1tot, P3tot, refine=refine)
+        h1 = enthalpy(T1tot, self.a)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (enthalpy(T3_iz, self.a) - h1) / (enthalpy(T3tot, self.a) - h1)
+
+
+@lru_cache(maxsize=16)
+def _gas_table(a: tuple, t_min: float, t_max: float, step: float) -> GasTable:
+    return GasTable(a, t_min, t_max, step)
+
+
+def gas_table(a=COEFFICIENTS, t_min: float=T_MIN, t_max: float=T_MAX, step: float=T_STEP) -> GasTable:
+    # Tables are built once per coefficient set and grid
+    return _gas_table(tuple(float(c) for c in a), float(t_min), float(t_max), float(step))
@@ -0,0 +1,259 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from utils.consts import RESIDUAL_TARGET
+from utils.parse_out import OUT_PATTERN, DomainScanner, out_blocks
+
+
+NUMBER = rb'[-+]?(?:\d+\.?\d*|\.\d+)(?:[Ee][-+]?\d+)?'
+
+# Solver output lines: the loop header of every iteration (time step of
+# transient runs) and the rows of its tables by their numeric cells,
+# | Equation | Rate | RMS Res | Max Res | ... of the residual table,
+# | Equation | Maximum Flow | Imbalance (%) | of the imbalance summary
+# below the | Domain Name : R1 | row of each domain, and | Monitor | Value |
+# of monitor points. Every line is matched from the
+# newline before it, a literal prefix the regex engine searches much
+# faster than a multiline ^.
+HISTORY_PATTERN = re.compile(
+    rb'\n[ \t]*(?:'
+    rb'(?:outer[ \t]+loop[ \t]+iteration|time[ \t]+step)[ \t]*=[ \t]*(\d+)|'
+    rb'\|[ \t]*([A-Za-z][^|\r\n]*)\|[ \t]*(' + NUMBER + rb')[ \t]*\|'
+    rb'(?:[ \t]*(' + NUMBER + rb')[ \t]*\|(?:[ \t]*(' + NUMBER + rb')[ \t]*\|)?)?'
+    rb'([ \t\r]*$)?|'
+    rb'\|[ \t]*domain[ \t]+name[ \t]*:[ \t]*([^|\r\n]*?)[ \t]*\|'
+    rb')',
+    re.IGNORECASE | re.MULTILINE
+)
+
+READ_SIZE = 1 << 22
+
+
+class Series:
+    # Rows of float columns in one array that doubles when full, so a long
+    # history costs a few reallocations and no Python object per value
+    def __init__(self, columns: tuple, capacity: int=64):
+        self.columns = columns
+        self._data = np.empty((capacity, len(columns)))
+        self._size = 0
+
+    @classmethod
+    def from_array(cls, columns: tuple, data: np.ndarray) -> 'Series':
+        series = cls(columns, capacity=max(len(data), 1))
+        series._data[:len(data)] = data
+        series._size = len(data)
+        return series
+
+    def append(self, row: tuple) -> None:
+        if self._size == len(self._data):
+            data = np.empty((2 * len(self._data), len(self.columns)))
+            data[:self._size] = self._data
+            self._data = data
+        self._data[self._size] = row
+        self._size += 1
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def data(self) -> np.ndarray:
+        return self._data[:self._size]
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self._data[:self._size, self.columns.index(column)]
+
+
+class History:
+    # Residual, imbalance and monitor histories, fed with the solver output
+    # in order. Imbalances are keyed by (domain, equation), domain is None
+    # for a table without domain rows.
+    RESIDUAL_COLUMNS = ('iteration', 'rate', 'rms', 'max')
+    IMBALANCE_COLUMNS = ('iteration', 'flow', 'imbalance')
+    MONITOR_COLUMNS = ('iteration', 'value')
+    TABLES = {'residuals': RESIDUAL_COLUMNS, 'imbalances': IMBALANCE_COLUMNS, 'monitors': MONITOR_COLUMNS}
+
+    def __init__(self):
+        self.iteration = None
+        self.residuals = {}
+        self.imbalances = {}
+        self.monitors = {}
+        self.domain = None
+        self._names = {}
+
+    def name(self, raw: bytes) -> str:
+        # Equation and monitor names repeat every iteration, decoded once
+        if (name := self._names.get(raw)) is None:
+            name = self._names[raw] = raw.strip().decode(errors='replace')
+        return name
+
+    def series(self, table: dict, key, columns: tuple) -> Series:
+        if (series := table.get(key)) is None:
+            series = table[key] = Series(columns)
+        return series
+
+    def feed(self, data, start: int=0, end: int=None) -> None:
+        # data holds complete lines, bytes or a memory map of the file. The
+        # line at start is only seen when data[start] is the newline before it.
+        end = len(data) if end is None else end
+        for match in HISTORY_PATTERN.finditer(data, start, end):
+            iteration, name, a, b, c, eol, domain = match.groups()
+            if iteration is not None:
+                self.iteration = int(iteration)
+                self.domain = None
+            elif self.iteration is None:
+                # Tables before the first iteration are mesh and partition
+                # statistics
+                continue
+            elif domain is not None:
+                self.domain = self.name(domain)
+            elif c is not None:
+                self.series(self.residuals, self.name(name), self.RESIDUAL_COLUMNS).append(
+                    (self.iteration, float(a), float(b), float(c)))
+            elif eol is None:
+                continue
+            elif b is not None:
+                self.series(self.imbalances, (self.domain, self.name(name)), self.IMBALANCE_COLUMNS).append(
+                    (self.iteration, float(a), float(b)))
+            else:
+                self.series(self.monitors, self.name(name), self.MONITOR_COLUMNS).append((self.iteration, float(a)))
+
+    def converged_at(self, target: float=RESIDUAL_TARGET) -> int:
+        # First iteration with the RMS residual of every equation within
+        # target, None when the run never gets there
+        if not self.residuals:
+            return None
+        rows = np.concatenate([s.data[:, [0, 2]] for s in self.residuals.values()])
+        iterations, inverse = np.unique(rows[:, 0], return_inverse=True)
+        worst = np.full(len(iterations), -np.inf)
+        np.maximum.at(worst, inverse, rows[:, 1])
+        hit = np.flatnonzero(worst <= target)
+        return int(iterations[hit[0]]) if len(hit) else None
+
+    def summary(self, target: float=RESIDUAL_TARGET) -> dict:
+        # Flat {column: value}: iteration count, convergence iteration and
+        # the last RMS, MAX, imbalance (%) per domain and monitor value by name
+        out = {'iterations': self.iteration, 'converged': self.converged_at(target)}
+        for name, series in self.residuals.items():
+            out[f'{name} RMS'] = float(series['rms'][-1])
+            out[f'{name} MAX'] = float(series['max'][-1])
+        for (domain, name), series in self.imbalances.items():
+            out[f'{domain} {name} Imbalance' if domain else f'{name} Imbalance'] = float(series['imbalance'][-1])
+        for name, series in self.monitors.items():
+            out[name] = float(series['value'][-1])
+        return out
+
+    def save(self, path: str) -> None:
+        # One array per table and name in a .npz file, imbalances are named
+        # domain/equation
+        np.savez(path, **{
+            f'{table}/{"/".join((key[0] or "", key[1])) if table == "imbalances" else key}': series.data
+            for table in self.TABLES for key, series in getattr(self, table).items()
+        })
+
+    @classmethod
+    def load(cls, path: str) -> 'History':
+        history = cls()
+        with np.load(path) as data:
+            for key in data.files:
+                table, name = key.split('/', 1)
+                if table == 'imbalances':
+                    domain, name = name.split('/', 1)
+                    name = (domain or None, name)
+                series = getattr(history, table)[name] = Series.from_array(cls.TABLES[table], data[key])
+                if len(series):
+                    history.iteration = max(history.iteration or 0, int(series['iteration'][-1]))
+        return history
+
+
+def read_history(outfile: str) -> History:
+    # Single pass over the .out of a finished run, memory-mapped or
+    # decompressed block by block
+    history = History()
+    for data, _ in out_blocks(outfile):
+        history.feed(data)
+    return history
+
+
+def _summary(outfile: str, target: float, save_dir: str) -> dict:
+    try:
+        history = read_history(outfile)
+    except (OSError, ValueError) as ex:
+        return {'file': outfile, 'error': str(ex)}
+    if save_dir:
+        history.save(os.path.join(save_dir, os.path.basename(outfile) + '.npz'))
+    return {'file': outfile, **history.summary(target)}
+
+
+def summarise(outfiles: list, target: float=RESIDUAL_TARGET, workers: int=None, save_dir: str=None) -> list:
+    # summary() of every .out plus its path, in the order of outfiles. The
+    # files are parsed in worker processes, save_dir gets their histories.
+    # A file that cannot be read has an error instead of its summary.
+    if save_dir:
+        os.makedirs(save_dir, exist_ok=True)
+    n = len(outfiles)
+    if workers == 1 or n < 2:
+        return [_summary(f, target, save_dir) for f in outfiles]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_summary, outfiles, [target] * n, [save_dir] * n,
+            chunksize=max(1, n // (4 * (workers or os.cpu_count())))))
+
+
+class OutFollower:
+    # Follows the .out of a running solver: every poll() parses only the
+    # bytes appended since the last one. A partial last line waits for the
+    # next poll with the newline before it, a file that shrank was
+    # restarted and is read again.
+    def __init__(self, outfile: str):
+        self.outfile = outfile
+        self.reset()
+
+    def reset(self) -> None:
+        self.offset = 0
+        self._partial = b'\n'
+        self._scanner = DomainScanner()
+        self.history = History()
+
+    @property
+    def domains(self) -> dict:
+        return self._scanner.domains
+
+    @property
+    def header_done(self) -> bool:
+        return self._scanner.done
+
+    def poll(self) -> int:
+        # Number of new bytes read, 0 when the file did not grow
+        try:
+            size = os.path.getsize(self.outfile)
+        except OSError:
+            return 0
+        if size < self.offset:
+            self.reset()
+        if size == self.offset:
+            return 0
+
+        read = 0
+        with open(self.outfile, 'rb') as f:
+            f.seek(self.offset)
+            while chunk := f.read(min(READ_SIZE, size - self.offset - read)):
+                read += len(chunk)
+                self.feed(chunk)
+                if self.offset + read >= size:
+                    break
+        self.offset += read
+        return read
+
+    def feed(self, chunk: bytes) -> None:
+        data = self._partial + chunk
+        end = data.rfind(b'\n') + 1
+        self._partial = data[end - 1:]
+        if end == 1:
+            return
+        if not self._scanner.done:
+            for match in OUT_PATTERN.finditer(data, 0, end):
+                if not self._scanner.feed(match):
+                    break
+        self.history.feed(data, 0, end)
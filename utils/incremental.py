@@ -0,0 +1,87 @@
+import os
+import csv
+import hashlib
+
+
+MANIFEST = 'output.manifest'
+
+
+def expressions_hash(expressions: list, header: list=None) -> str:
+    lines = [e.strip() for e in expressions] + ([','.join(header)] if header is not None else [])
+    return hashlib.sha1('\n'.join(lines).encode()).hexdigest()[:16]
+
+
+def file_state(path: str) -> tuple:
+    # The size and mtime the generated Perl gets from stat()
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return str(stat.st_size), str(int(stat.st_mtime))
+
+
+def read_manifest(manifest: str) -> list:
+    # [path, size, mtime, hash] per output.csv row, in the same order
+    if not os.path.exists(manifest):
+        return []
+    with open(manifest, 'r', newline='') as f:
+        return [line.rstrip('\r\n').split('\t') for line in f if line.count('\t') == 3]
+
+
+def read_output(output_dir: str) -> tuple:
+    # (header, rows) of output.csv, (None, []) without one
+    csv_file = os.path.join(output_dir, 'output.csv')
+    if not os.path.exists(csv_file):
+        return None, []
+    with open(csv_file, 'r', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        return header, list(reader)
+
+
+def manifest_matches(entries: list, rows: list, exp_hash: str) -> bool:
+    # Every row is followed by its manifest line, a run killed in between
+    # leaves one row without it. Anything else is a manifest of another run.
+    return bool(entries) and len(rows) in (len(entries), len(entries) + 1) and not (
+        any(e[3] != exp_hash for e in entries)
+        or any(os.path.basename(e[0]) != row[0] for e, row in zip(entries, rows)))
+
+
+def recorded_files(output_dir: str, exp_hash: str) -> dict:
+    # {res file: (size, mtime)} of the rows an incremental run with
+    # exp_hash keeps if the files did not change, {} when it starts over
+    entries = read_manifest(os.path.join(output_dir, MANIFEST))
+    if not manifest_matches(entries, read_output(output_dir)[1], exp_hash):
+        return {}
+    return {e[0]: (e[1], e[2]) for e in entries}
+
+
+def prepare_incremental(output_dir: str, res_files: list, exp_hash: str) -> tuple:
+    # Returns (res files to compute, append). Rows of files that changed
+    # since they were computed are dropped from output.csv and the manifest
+    # so the appended rows do not duplicate them. A different expression
+    # set or a missing manifest means a full run.
+    csv_file = os.path.join(output_dir, 'output.csv')
+    manifest = os.path.join(output_dir, MANIFEST)
+    entries = read_manifest(manifest)
+    header, rows = read_output(output_dir)
+
+    if not manifest_matches(entries, rows, exp_hash):
+        if os.path.exists(manifest):
+            os.remove(manifest)
+        return list(res_files), False
+
+    kept = {}
+    for entry, row in zip(entries, rows):
+        if file_state(entry[0]) == (entry[1], entry[2]) or not os.path.exists(entry[0]):
+            kept.pop(entry[0], None)
+            kept[entry[0]] = (entry, row)
+
+    with open(csv_file, 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(header)
+        writer.writerows(row for _, row in kept.values())
+    with open(manifest, 'w', newline='') as f:
+        f.writelines('\t'.join(entry) + '\n' for entry, _ in kept.values())
+
+    return [f for f in res_files if f not in kept], True
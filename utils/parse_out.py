@@ -1,37 +1,190 @@
 import re
 import os
+import gzip
+import lzma
+import mmap
+import zlib
+import hashlib
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
-def get_domains(outfile: str) -> dict:
-
-    dmn_pattern = re.compile(r'domain:\s*\d*\w+\d*')
-    bnd_pattern = re.compile(r'boundary:[\s\d\w]*')
-    bnd_end_pattern = re.compile(r'domain\s+models:\s*')
-    
-    domains = {}
-    dmn_find = False
-
-    with open(outfile, 'r') as fi:
-        for line in fi.readlines():
-            if re.fullmatch(pattern=dmn_pattern, string=line.lower().strip()):
-                dmn = line.split(sep=':')[1].strip()
-                domains[dmn] = []
-                dmn_find = True
-            if dmn_find:
-                if re.fullmatch(pattern=bnd_pattern, string=line.lower().strip()):
-                    bnd = line.split(sep=':')[1].strip()
-                    domains[dmn].append(bnd)
-            if re.fullmatch(pattern=bnd_end_pattern, string=line.lower().strip()):
-                dmn_find = False
-            
-    return domains
-            
-
-def get_files(ext: str, directory: str) -> list:
-    
+
+# One pass over the raw bytes: domain and boundary headers, the closing
+# "Domain Models:" of each domain and the "+----" banners that separate
+# the command language echo from the solver output.
+OUT_PATTERN = re.compile(
+    rb'^[ \t]*(?:'
+    rb'domain:[ \t]*(?P<domain>\w+)|'
+    rb'boundary:(?P<boundary>[\w \t]*)|'
+    rb'(?P<models>domain[ \t]+models:)|'
+    rb'(?P<banner>\+-+\+?)'
+    rb')[ \t\r]*$',
+    re.IGNORECASE | re.MULTILINE
+)
+
+
+# Mesh statistics the solver prints per domain before the first iteration
+MESH_PATTERN = re.compile(
+    rb'^[ \t]*(?:'
+    rb'domain[ \t]+name[ \t]*:[ \t]*(?P<domain>\w[\w \t]*?)[ \t\r]*$|'
+    rb'total[ \t]+number[ \t]+of[ \t]+(?P<kind>nodes|elements)[ \t]*=[ \t]*(?P<count>\d+)|'
+    rb'(?P<loop>outer[ \t]+loop[ \t]+iteration|time[ \t]+step[ \t]*=)'
+    rb')',
+    re.IGNORECASE | re.MULTILINE
+)
+
+
+PROGRESS_STEP = 1 << 20
+
+
+def zstd_reader(f):
+    if zstandard is None:
+        raise ValueError('Reading .zst files needs the zstandard package')
+    return zstandard.ZstdDecompressor().stream_reader(f)
+
+
+# Archived .out files are read through a streaming decompressor
+DECOMPRESSORS = {
+    '.gz': lambda f: gzip.GzipFile(fileobj=f, mode='rb'),
+    '.xz': lzma.LZMAFile,
+    '.zst': zstd_reader
+}
+OUT_SUFFIXES = ('.out',) + tuple(f'.out{ext}' for ext in DECOMPRESSORS)
+DECOMPRESS_ERRORS = (EOFError, zlib.error, gzip.BadGzipFile, lzma.LZMAError) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+def is_compressed(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in DECOMPRESSORS
+
+
+def out_blocks(outfile: str, block_size: int=PROGRESS_STEP):
+    # (data, scanned): the memory-mapped file at once, or for a compressed
+    # file its complete lines in blocks of about block_size decompressed
+    # bytes, each starting with the newline before its first line. scanned
+    # is the position in the file on disk. A compressed file is only
+    # decompressed as far as the caller iterates.
+    with open(outfile, 'rb') as fi:
+        if not is_compressed(outfile):
+            if os.fstat(fi.fileno()).st_size:
+                with mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    yield mm, len(mm)
+            return
+
+        stream = DECOMPRESSORS[os.path.splitext(outfile)[1].lower()](fi)
+        partial = b'\n'
+        try:
+            while chunk := stream.read(block_size):
+                data = partial + chunk
+                end = data.rfind(b'\n') + 1
+                partial = data[end - 1:]
+                if end > 1:
+                    yield data[:end], fi.tell()
+        except DECOMPRESS_ERRORS as ex:
+            raise ValueError(f'Corrupt compressed file {outfile}: {ex}') from ex
+        if len(partial) > 1:
+            yield partial + b'\n', fi.tell()
+
+
+class DomainScanner:
+    # State of the physics header scan, fed with OUT_PATTERN matches in
+    # file order. done is set at the first banner after the last domain.
+    def __init__(self):
+        self.domains = {}
+        self.done = False
+        self._domain = None
+        self._models = False
+
+    def feed(self, match: re.Match) -> bool:
+        # False once the physics definition is over
+        if match['domain'] is not None:
+            self._domain = match['domain'].decode(errors='replace')
+            self.domains[self._domain] = []
+        elif match['boundary'] is not None:
+            if self._domain is not None:
+                self.domains[self._domain].append(match['boundary'].decode(errors='replace').strip())
+        elif match['models'] is not None:
+            self._domain = None
+            self._models = True
+        elif self._models:
+            # The physics definition is over, the rest is solver output
+            self.done = True
+        return not self.done
+
+
+def get_domains(outfile: str, progress: callable=None, cancelled: callable=None) -> dict:
+    # progress(scanned, total) is called about every PROGRESS_STEP bytes,
+    # None is returned as soon as cancelled() becomes true.
+
+    scanner = DomainScanner()
+    reported = 0
+
+    if is_compressed(outfile):
+        # Decompressed only up to the end of the physics definition
+        total = os.path.getsize(outfile)
+        for data, scanned in out_blocks(outfile):
+            if cancelled and cancelled():
+                return None
+            if progress:
+                progress(scanned, total)
+            for match in OUT_PATTERN.finditer(data):
+                if not scanner.feed(match):
+                    break
+            if scanner.done:
+                break
+        if progress and total:
+            progress(total, total)
+        return scanner.domains
+
+    with open(outfile, 'rb') as fi:
+        total = os.fstat(fi.fileno()).st_size
+        if not total:
+            return scanner.domains
+        with mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for match in OUT_PATTERN.finditer(mm):
+                if match.end() - reported >= PROGRESS_STEP:
+                    reported = match.end()
+                    if cancelled and cancelled():
+                        return None
+                    if progress:
+                        progress(reported, total)
+                if not scanner.feed(match):
+                    break
+
+    if progress:
+        progress(total, total)
+    return scanner.domains
+
+
+def mesh_fingerprint(outfile: str) -> str:
+    # Hash of the node and element counts of every domain, None when the
+    # .out has no mesh statistics
+    counts = []
+    domain = b''
+    loop = False
+    for data, _ in out_blocks(outfile):
+        for match in MESH_PATTERN.finditer(data):
+            if loop := match['loop'] is not None:
+                break
+            if match['domain'] is not None:
+                domain = match['domain']
+            else:
+                counts.append(b'%s|%s|%s' % (domain, match['kind'].lower(), match['count']))
+        if loop:
+            break
+    if not counts:
+        return None
+    return hashlib.blake2b(b'\n'.join(counts), digest_size=10).hexdigest()
+
+
+def get_files(ext, directory: str) -> list:
+    # ext is one extension or a tuple of them
+    suffixes = tuple(f'.{e}' for e in ((ext,) if isinstance(ext, str) else ext))
     files = []
     for file in os.listdir(directory):
-        if file.endswith(f'.{ext}'):
+        if file.endswith(suffixes):
             files.append(os.path.join(directory, file))
-    
+
     return files
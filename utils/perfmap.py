@@ -0,0 +1,154 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from utils.cache import file_key
+from utils.results_store import read_csv_columns, to_float
+
+
+VALUES = ('Pi_ts', 'Pi_tt', 'Eff')
+# -dPi_tt/dGcorr * Gcorr/Pi_tt above which a speedline counts as choked
+CHOKE_SLOPE = 10.0
+
+
+def pchip_slopes(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    # Fritsch-Carlson derivatives: the interpolant is monotone wherever the
+    # data are, no overshoot between points
+    n = len(x)
+    if n < 2:
+        return np.zeros(n)
+    h = np.diff(x)
+    delta = np.diff(y) / h
+    if n == 2:
+        return np.array([delta[0], delta[0]])
+
+    d = np.zeros(n)
+    w1 = 2 * h[1:] + h[:-1]
+    w2 = h[1:] + 2 * h[:-1]
+    same = delta[:-1] * delta[1:] > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d[1:-1] = np.where(same, (w1 + w2) / (w1 / delta[:-1] + w2 / delta[1:]), 0.0)
+    d[0] = end_slope(h[0], h[1], delta[0], delta[1])
+    d[-1] = end_slope(h[-1], h[-2], delta[-1], delta[-2])
+    return d
+
+
+def end_slope(h0: float, h1: float, delta0: float, delta1: float) -> float:
+    # Three point end slope, limited to keep the end interval monotone
+    d = ((2 * h0 + h1) * delta0 - h0 * delta1) / (h0 + h1)
+    if np.sign(d) != np.sign(delta0):
+        return 0.0
+    if np.sign(delta0) != np.sign(delta1) and abs(d) > abs(3 * delta0):
+        return 3 * delta0
+    return d
+
+
+def pchip_eval(x: np.ndarray, y: np.ndarray, d: np.ndarray, xq: np.ndarray) -> np.ndarray:
+    # Cubic Hermite interpolant through (x, y) with slopes d, nan outside x
+    xq = np.asarray(xq, dtype=float)
+    if len(x) < 2:
+        return np.where(xq == x[0], y[0], np.nan) if len(x) else np.full(xq.shape, np.nan)
+    i = np.clip(np.searchsorted(x, xq) - 1, 0, len(x) - 2)
+    h = x[i + 1] - x[i]
+    t = (xq - x[i]) / h
+    out = ((2 * t**3 - 3 * t**2 + 1) * y[i] + (t**3 - 2 * t**2 + t) * h * d[i]
+        + (-2 * t**3 + 3 * t**2) * y[i + 1] + (t**3 - t**2) * h * d[i + 1])
+    return np.where((xq >= x[0]) & (xq <= x[-1]), out, np.nan)
+
+
+class Speedline:
+    # One curve sorted by corrected flow, points with the same Gcorr are
+    # averaged
+    def __init__(self, name: str, gcorr: np.ndarray, values: dict):
+        order = np.argsort(gcorr, kind='stable')
+        self.gcorr, inverse, counts = np.unique(gcorr[order], return_inverse=True, return_counts=True)
+        self.name = name
+        self.values = {
+            key: np.bincount(inverse, weights=v[order], minlength=len(self.gcorr)) / counts
+            for key, v in values.items()
+        }
+        self.slopes = {key: pchip_slopes(self.gcorr, v) for key, v in self.values.items()}
+        self.last_stable, self.choke, self.choked = self.limits()
+
+    def limits(self) -> tuple:
+        # (last stable index, choke index, whether the line reaches choke).
+        # Left of the Pi_tt peak the characteristic rises with flow, the
+        # classic surge criterion; choke is the first point from there on
+        # where the line turns steeply down.
+        pi = self.values.get('Pi_tt')
+        n = len(self.gcorr)
+        if pi is None or n < 2:
+            return 0, n - 1, False
+        stable = int(np.nanargmax(pi))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = -self.slopes['Pi_tt'] * self.gcorr / pi
+        steep = np.flatnonzero(slope[stable:] > CHOKE_SLOPE)
+        if len(steep):
+            return stable, stable + int(steep[0]), True
+        return stable, n - 1, False
+
+    def __call__(self, gcorr, key: str) -> np.ndarray:
+        return pchip_eval(self.gcorr, self.values[key], self.slopes[key], gcorr)
+
+    def summary(self) -> dict:
+        return {
+            'curve': self.name, 'points': len(self.gcorr),
+            'gcorr_min': float(self.gcorr[0]), 'gcorr_max': float(self.gcorr[-1]),
+            'last_stable_gcorr': float(self.gcorr[self.last_stable]),
+            'choke_gcorr': float(self.gcorr[self.choke]), 'choked': self.choked
+        }
+
+
+class PerformanceMap:
+    # Speedlines of a performance_map.csv. Rows with a Gcorr or a value
+    # that is not a finite number (failed or unparsable cells) are left out.
+    def __init__(self, curves: list, gcorr: np.ndarray, values: dict):
+        gcorr = np.asarray(gcorr, dtype=float)
+        finite = np.isfinite(gcorr)
+        for v in values.values():
+            finite &= np.isfinite(v)
+        curves = np.asarray(curves, dtype=object)[finite]
+        gcorr = gcorr[finite]
+        values = {key: np.asarray(v, dtype=float)[finite] for key, v in values.items()}
+        self.speedlines = {}
+        for name in dict.fromkeys(curves):
+            rows = curves == name
+            self.speedlines[name] = Speedline(name, gcorr[rows], {k: v[rows] for k, v in values.items()})
+
+    @classmethod
+    def from_csv(cls, csv_file: str) -> 'PerformanceMap':
+        _, columns = read_csv_columns(csv_file)
+        return cls(columns['CurveName'], to_float(columns['Gcorr']),
+            {key: to_float(columns[key]) for key in VALUES if key in columns})
+
+    def query(self, curves, gcorr) -> dict:
+        # {value: array} interpolated at every (curve, Gcorr) pair, nan for
+        # unknown curves and flows outside the speedline
+        curves = np.asarray(curves, dtype=object)
+        gcorr = np.broadcast_to(np.asarray(gcorr, dtype=float), curves.shape)
+        keys = list(dict.fromkeys(k for line in self.speedlines.values() for k in line.values))
+        out = {key: np.full(curves.shape, np.nan) for key in keys}
+        names, inverse = np.unique(curves.astype(str), return_inverse=True)
+        inverse = inverse.reshape(curves.shape)
+        for n, name in enumerate(names):
+            if (line := self.speedlines.get(name)) is None:
+                continue
+            rows = inverse == n
+            for key in line.values:
+                out[key][rows] = line(gcorr[rows], key)
+        return out
+
+    def limits(self) -> list:
+        return [line.summary() for line in self.speedlines.values()]
+
+
+@lru_cache(maxsize=32)
+def _load(csv_file: str, key: str) -> PerformanceMap:
+    return PerformanceMap.from_csv(csv_file)
+
+
+def load_performance_map(csv_file: str) -> PerformanceMap:
+    # Built once per content of the file, a rewritten file is read again
+    csv_file = os.path.abspath(csv_file)
+    return _load(csv_file, file_key(csv_file))
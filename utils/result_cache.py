@@ -0,0 +1,99 @@
+import os
+import csv
+import json
+import math
+
+from utils.consts import RESULTS_CACHE
+from utils.cache import file_key
+from utils.expressions import expression_hashes
+
+
+RESULTS = 'results.tsv'
+
+
+class ResultCache:
+    # One JSON file {expression hash: value} per res file fingerprint
+    def __init__(self, directory: str=RESULTS_CACHE):
+        self.directory = directory
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f'{key}.json')
+
+    def get(self, res_file: str) -> dict:
+        try:
+            with open(self.path(file_key(res_file)), 'r') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def update(self, res_file: str, values: dict) -> None:
+        path = self.path(file_key(res_file))
+        stored = self.get(res_file)
+        stored.update(values)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, 'w') as f:
+                json.dump(stored, f)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+
+def output_hashes(expressions: list, header: list=None) -> dict:
+    hashes = expression_hashes(expressions)
+    return hashes if header is None else {var: hashes[var] for var in header}
+
+
+def cached_values(cache: ResultCache, res_files: list, expressions: list, header: list=None) -> dict:
+    # {res file: {var: value}} of the values the cache already has
+    hashes = output_hashes(expressions, header)
+    cached = {}
+    for res_file in res_files:
+        if not os.path.exists(res_file):
+            continue
+        stored = cache.get(res_file)
+        values = {var: stored[h] for var, h in hashes.items() if h in stored}
+        if values:
+            cached[res_file] = values
+    return cached
+
+
+def read_results(results_file: str) -> dict:
+    # {res file: {var: value}} from the results.tsv a cached run writes
+    results = {}
+    if not os.path.exists(results_file):
+        return results
+    with open(results_file, 'r', newline='') as f:
+        reader = csv.reader(f, delimiter='\t')
+        header = next(reader, None)
+        for row in reader:
+            if len(row) == len(header):
+                results[row[0]] = dict(zip(header[1:], map(float, row[1:])))
+    return results
+
+
+def collect_results(cache: ResultCache, output_dir: str, res_files: list, expressions: list,
+        results_files: list=None, header: list=None) -> list:
+    # Stores the fresh values of results_files and writes output.csv from
+    # the cache in the order of res_files. Returns files without all values.
+    hashes = output_hashes(expressions, header)
+    header = list(hashes)
+    results_files = results_files or [os.path.join(output_dir, RESULTS)]
+    for results_file in results_files:
+        for res_file, values in read_results(results_file).items():
+            cache.update(res_file, {
+                hashes[var]: v for var, v in values.items() if var in hashes and math.isfinite(v)
+            })
+
+    missing = []
+    with open(os.path.join(output_dir, 'output.csv'), 'w') as f:
+        f.write('file,' + ', '.join(header) + '\n')
+        for res_file in res_files:
+            stored = cache.get(res_file) if os.path.exists(res_file) else {}
+            if not all(h in stored for h in hashes.values()):
+                missing.append(res_file)
+                continue
+            values = ', '.join('%.5f' % stored[hashes[var]] for var in header)
+            f.write(f'{os.path.basename(res_file)},{values}\n')
+    return missing
@@ -0,0 +1,194 @@
+import os
+import csv
+import json
+import time
+import hashlib
+
+import numpy as np
+
+from utils.consts import STORE_DIR
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+# Tables of the CSV files the generated sessions write
+OUTPUT = 'output'
+PERFORMANCE_MAP = 'performance_map'
+CSV_FILES = {OUTPUT: 'output.csv', PERFORMANCE_MAP: 'performance_map.csv'}
+# Text columns, stored as codes into a list of their distinct values
+CATEGORIES = {OUTPUT: ['file'], PERFORMANCE_MAP: ['CurveName', 'Inlet', 'Outlet']}
+
+
+def read_csv_columns(csv_file: str) -> tuple:
+    # (table, {column: list of str}) of an output.csv or performance_map.csv
+    with open(csv_file, 'r', newline='') as f:
+        reader = csv.reader(f, skipinitialspace=True)
+        header = [h.strip() for h in next(reader)]
+        rows = [row for row in reader if len(row) == len(header)]
+    table = PERFORMANCE_MAP if header[0] == 'CurveName' else OUTPUT
+    return table, {name: [row[i].strip() for row in rows] for i, name in enumerate(header)}
+
+
+def to_float(values: list) -> np.ndarray:
+    out = np.empty(len(values), dtype=float)
+    for i, v in enumerate(values):
+        try:
+            out[i] = float(v)
+        except ValueError:
+            out[i] = np.nan
+    return out
+
+
+def file_id(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=8)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultsStore:
+    # One directory per table and run: a .npy file per column, read back
+    # memory-mapped, or a single .parquet file when pyarrow is installed
+    # and asked for. meta.json of the run holds the run and template ids.
+    def __init__(self, directory: str=STORE_DIR, parquet: bool=False):
+        if parquet and pq is None:
+            raise ImportError('Parquet needs pyarrow')
+        self.directory = directory
+        self.parquet = parquet
+
+    def run_dir(self, table: str, run_id: str) -> str:
+        return os.path.join(self.directory, table, run_id)
+
+    def ingest(self, csv_file: str, run_id: str=None, template_id: str=None) -> str:
+        # Stores the rows of csv_file under run_id (default: the hash of its
+        # content, ingesting the same file twice stores it once)
+        table, columns = read_csv_columns(csv_file)
+        run_id = run_id or file_id(csv_file)
+        run_dir = self.run_dir(table, run_id)
+        os.makedirs(run_dir, exist_ok=True)
+
+        types = {}
+        arrays = {}
+        for name, values in columns.items():
+            if name in CATEGORIES[table]:
+                categories, codes = np.unique(np.array(values, dtype=str), return_inverse=True)
+                arrays[name] = (codes.astype(np.int32), categories.tolist())
+                types[name] = 'category'
+            else:
+                arrays[name] = to_float(values)
+                types[name] = 'float'
+
+        if self.parquet:
+            pq.write_table(pa.table({
+                name: pa.DictionaryArray.from_arrays(*value) if types[name] == 'category' else value
+                for name, value in arrays.items()
+            }), os.path.join(run_dir, 'data.parquet'))
+        else:
+            for name, value in arrays.items():
+                if types[name] == 'category':
+                    np.save(os.path.join(run_dir, f'{name}.npy'), value[0])
+                    with open(os.path.join(run_dir, f'{name}.json'), 'w') as f:
+                        json.dump(value[1], f)
+                else:
+                    np.save(os.path.join(run_dir, f'{name}.npy'), value)
+
+        meta = {
+            'run_id': run_id, 'template_id': template_id, 'table': table, 'columns': types,
+            'rows': len(next(iter(columns.values()), [])), 'source': os.path.abspath(csv_file),
+            'ingested': time.time(), 'format': 'parquet' if self.parquet else 'npy'
+        }
+        with open(os.path.join(run_dir, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=1)
+        return run_id
+
+    def ingest_run(self, output_dir: str, run_id: str=None, template_id: str=None) -> dict:
+        # {table: run id} of the CSV files a session wrote to output_dir
+        return {
+            table: self.ingest(path, run_id=run_id, template_id=template_id)
+            for table, name in CSV_FILES.items() if os.path.exists(path := os.path.join(output_dir, name))
+        }
+
+    def runs(self, table: str, template_id: str=None) -> list:
+        # meta.json of the stored runs, oldest first
+        table_dir = os.path.join(self.directory, table)
+        metas = []
+        if os.path.isdir(table_dir):
+            for entry in os.scandir(table_dir):
+                try:
+                    with open(os.path.join(entry.path, 'meta.json'), 'r') as f:
+                        meta = json.load(f)
+                except (OSError, json.JSONDecodeError):
+                    continue
+                if template_id is None or meta['template_id'] == template_id:
+                    metas.append(meta)
+        return sorted(metas, key=lambda m: m['ingested'])
+
+    def query(self, table: str, curves: list=None, files: list=None, run_ids: list=None,
+            template_id: str=None, columns: list=None) -> dict:
+        # {column: array} of the rows of the matching runs with the given
+        # curves (performance_map) or files (output, base names), plus the
+        # run_id and template_id of every row. Only the selected rows of
+        # the requested columns are read.
+        parts = []
+        for meta in self.runs(table, template_id):
+            if run_ids is not None and meta['run_id'] not in run_ids:
+                continue
+            # The key column counts the rows of runs without the requested ones
+            names = [c for c in (columns or meta['columns']) if c in meta['columns']] or CATEGORIES[table][:1]
+            filters = {'CurveName': curves, 'file': files}
+            filters = {k: v for k, v in filters.items() if v is not None and k in meta['columns']}
+            part = self.read_run(meta, names, filters)
+            rows = len(next(iter(part.values()))) if part else 0
+            part['run_id'] = np.full(rows, meta['run_id'], dtype=object)
+            part['template_id'] = np.full(rows, meta['template_id'], dtype=object)
+            parts.append(part)
+
+        # Columns a run does not have are nan
+        names = list(dict.fromkeys(name for part in parts for name in part))
+        if columns:
+            names = [name for name in names if name in columns or name in ('run_id', 'template_id')]
+        result = {}
+        for part in parts:
+            rows = len(part['run_id'])
+            for name in names:
+                result.setdefault(name, []).append(part.get(name, np.full(rows, np.nan)))
+        return {name: np.concatenate(values) for name, values in result.items()}
+
+    def read_run(self, meta: dict, names: list, filters: dict) -> dict:
+        run_dir = self.run_dir(meta['table'], meta['run_id'])
+        if meta['format'] == 'parquet':
+            if pq is None:
+                raise ImportError('Parquet needs pyarrow')
+            data = pq.read_table(os.path.join(run_dir, 'data.parquet'), columns=names,
+                filters=[(k, 'in', list(v)) for k, v in filters.items()] or None)
+            return {
+                name: np.asarray(data[name].to_pylist(), dtype=object if meta['columns'][name] == 'category' else float)
+                for name in names
+            }
+
+        def categories(name: str) -> list:
+            with open(os.path.join(run_dir, f'{name}.json'), 'r') as f:
+                return json.load(f)
+
+        mask = None
+        for name, wanted in filters.items():
+            codes = np.load(os.path.join(run_dir, f'{name}.npy'), mmap_mode='r')
+            wanted = set(wanted)
+            selected = [i for i, value in enumerate(categories(name)) if value in wanted]
+            match = np.isin(codes, selected)
+            mask = match if mask is None else mask & match
+        rows = slice(None) if mask is None else np.flatnonzero(mask)
+
+        out = {}
+        for name in names:
+            values = np.load(os.path.join(run_dir, f'{name}.npy'), mmap_mode='r')[rows]
+            if meta['columns'][name] == 'category':
+                out[name] = np.asarray(categories(name), dtype=object)[values]
+            else:
+                out[name] = np.array(values)
+        return out
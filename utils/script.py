@@ -0,0 +1,282 @@
+import os
+
+from utils.consts import LIST_THRESHOLD
+from utils.cse_generator import CodeGenerator
+from utils.incremental import expressions_hash, prepare_incremental, MANIFEST
+from utils.result_cache import ResultCache, cached_values, collect_results, RESULTS
+from utils.checkpoint import trim_csv, CHECKPOINT
+from utils.expressions import output_expressions, expression_domains, dependency_order, split_expression
+from utils.topology import group_files, group_order
+
+
+def convert_path(path: str):
+    sep = os.path.sep
+    if sep != '/':
+        path = path.replace(os.path.sep, '/')
+    return path
+
+
+def write_list(path: str, rows) -> None:
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', newline='') as f:
+        f.writelines('\t'.join(map(str, row)) + '\n' for row in rows)
+
+
+def perl_arrays(cse_code: CodeGenerator, output_dir: str, name: str, columns: dict) -> str:
+    # Parallel Perl arrays {varname: values}, written to name.list in
+    # output_dir and read by the session once they get long
+    if len(next(iter(columns.values()))) < LIST_THRESHOLD:
+        return ''.join(
+            cse_code.gen_perl_array(variables=values, varname=varname,
+                vartype='numeric' if varname == 'groups' else 'string')
+            for varname, values in columns.items()
+        )
+    path = os.path.join(output_dir, f'{name}.list')
+    write_list(path, zip(*columns.values()))
+    return cse_code.gen_perl_read_list(filename=convert_path(path), varnames=list(columns))
+
+
+def gen_script(output_dir: str, expressions: list=None, res_files: list=None,
+        domains: dict=None, performance_map: dict=None, timings: bool=False,
+        manifest: bool=False, cached: dict=None, checkpoint: bool=False, done: dict=None,
+        groups: dict=None) -> str:
+    # The whole session file as one string, see iter_script
+    return ''.join(iter_script(output_dir=output_dir, expressions=expressions, res_files=res_files,
+        domains=domains, performance_map=performance_map, timings=timings, manifest=manifest,
+        cached=cached, checkpoint=checkpoint, done=done, groups=groups))
+
+
+def iter_script(output_dir: str, expressions: list=None, res_files: list=None,
+        domains: dict=None, performance_map: dict=None, timings: bool=False,
+        manifest: bool=False, cached: dict=None, checkpoint: bool=False, done: dict=None,
+        groups: dict=None):
+    # expressions are dicts with 'expression', 'description' and 'add' keys
+    # as collected by MainWindow.run or read by utils.template. With timings
+    # the seconds spent on every res file go to timings.csv. With manifest
+    # every computed file is recorded in output.manifest and files already
+    # recorded for the same expressions are skipped, new rows are appended.
+    # With cached ({res file: {var: value}} from utils.result_cache) only
+    # files and expressions without a cached value are computed and the
+    # values go to results.tsv for collect_results to join. With checkpoint
+    # every finished file is recorded in output.checkpoint; done (from
+    # utils.checkpoint.read_checkpoint) resumes a run after those files.
+    # Only checked ('add') expressions are written and only the expressions
+    # they depend on are computed, in dependency order. Only the domains
+    # of the locations the expressions and curves use are loaded. With
+    # groups ({res file: mesh group} from utils.topology) files of a group
+    # run one after another and only the first one is force reloaded and
+    # turbo initialised. The script is yielded in fragments, file lists and
+    # cached values of LIST_THRESHOLD entries or more go to .list files in
+    # output_dir that the session reads line by line.
+
+    cse_code = CodeGenerator()
+
+    res_files = [] if not res_files else res_files
+    expressions, header = ([], []) if not expressions else output_expressions(expressions)
+    variables = [f'${h}' for h in header]
+    var_format = ['%.5f'] * len(variables)
+    domains = {} if not domains else domains
+
+    csv = convert_path(os.path.join(output_dir, 'output.csv'))
+
+    res_files_array_name = 'files'
+    filename = '$f'
+    if groups:
+        load_file = cse_code.load_group_file(filename=filename)
+        gen_loop = cse_code.gen_perl_index_loop
+    else:
+        load_file = cse_code.load_file(filename=filename)
+        gen_loop = cse_code.gen_perl_loop
+
+    yield cse_code.gen_init(domains=expression_domains(expressions, domains), modules=['Time::HiRes'] if timings else None)
+    # Compute efficiency subroutine
+    yield cse_code.perl_eff_subroutine()
+    if checkpoint:
+        checkpoint_file = convert_path(os.path.join(output_dir, CHECKPOINT))
+        yield cse_code.gen_perl_open_file(filename=checkpoint_file, filevar='CH', open_as='>>' if done else '>')
+        yield cse_code.gen_perl_autoflush(filevar='CH')
+    if done:
+        done_files = set(done['files'])
+        res_files = [f for f in res_files if f not in done_files]
+        done_curves = {curve: set(files) for curve, files in done['curves'].items()}
+        performance_map = {
+            curve: dict(data, files=[f for f in data['files'] if f not in done_curves.get(curve, ())])
+            for curve, data in (performance_map or {}).items()
+        }
+    # Compute Expressions
+    if cached is not None:
+        res_files = [f for f in res_files if len(cached.get(f, {})) < len(header)]
+        manifest = False
+    if res_files:
+        yield cse_code.turbo_init() if not groups else cse_code.gen_perl_expressions(expressions=['$group = -1'])
+        if cached is not None:
+            cached = {f: cached[f] for f in res_files if f in cached}
+            cached_vars = {
+                var: all(var in cached.get(f, {}) for f in res_files)
+                for var in header if any(var in values for values in cached.values())
+            }
+            if len(cached) < LIST_THRESHOLD:
+                yield cse_code.gen_perl_hash(values=cached)
+            else:
+                path = os.path.join(output_dir, 'cache.list')
+                write_list(path, ((f, var, repr(v)) for f, values in cached.items() for var, v in values.items()))
+                yield cse_code.gen_perl_read_hash(filename=convert_path(path))
+            yield cse_code.gen_perl_open_file(filename=convert_path(os.path.join(output_dir, RESULTS)))
+            yield cse_code.write_to_file(code='"file\\t' + '\\t'.join(header) + '\\n"')
+        elif manifest:
+            exp_hash = expressions_hash(expressions, header)
+            manifest_file = convert_path(os.path.join(output_dir, MANIFEST))
+            yield cse_code.gen_perl_manifest(filename=manifest_file, exp_hash=exp_hash)
+            yield cse_code.gen_perl_open_file(filename=csv, append_var='append')
+            yield cse_code.gen_perl_autoflush()
+            yield cse_code.gen_perl_if(
+                code=cse_code.write_to_file(code='"file,'+str(header)[1:-1].replace("'",'')+'\\n"'),
+                condition='!$append'
+            )
+            yield cse_code.gen_perl_open_file(filename=manifest_file, filevar='MH', append_var='append')
+            yield cse_code.gen_perl_autoflush(filevar='MH')
+        elif done and done['files']:
+            yield cse_code.gen_perl_open_file(filename=csv, open_as='>>')
+        else:
+            yield cse_code.gen_perl_open_file(filename=csv)
+            yield cse_code.write_to_file(code='"file,'+str(header)[1:-1].replace("'",'')+'\\n"')
+        if checkpoint:
+            yield cse_code.gen_perl_autoflush()
+        columns = {}
+        if groups:
+            res_files, columns['groups'] = group_files(res_files, groups)
+        columns[res_files_array_name] = res_files
+        yield perl_arrays(cse_code, output_dir, res_files_array_name, columns)
+        if timings:
+            timings_csv = convert_path(os.path.join(output_dir, 'timings.csv'))
+            yield cse_code.gen_perl_open_file(filename=timings_csv, filevar='TH')
+
+        code_inside_loop = '' if not manifest else cse_code.gen_perl_skip_done(filename=filename)
+        code_inside_loop += '' if not timings else cse_code.gen_perl_expressions(expressions=['$t0 = Time::HiRes::time()'])
+        code_inside_loop += load_file
+        if cached is not None:
+            # Outputs every file has cached are read from the cache, only the
+            # expressions the other outputs depend on are computed
+            full = tuple(var for var, every in cached_vars.items() if every)
+            exps = [e for e in expressions if split_expression(e)[0] in full]
+            exps += dependency_order(expressions, outputs=[h for h in header if h not in full], known=('f',) + full)
+            code_inside_loop += cse_code.gen_perl_expressions(expressions=exps, cached=cached_vars, filename=filename, hoist=True)
+            code_to_write = '"%s' + '\\t%.17g' * len(variables) + f'\\n", {filename}, ' + ', '.join(variables)
+        else:
+            code_inside_loop += cse_code.gen_perl_expressions(expressions=expressions, hoist=True)
+            code_to_write = f'"%s,' + str(var_format)[1:-1].replace("'", '') + f'\\n", basename({filename}),' + str(variables)[1:-1].replace("'", '')
+        code_inside_loop += cse_code.write_to_file(code=code_to_write)
+        if manifest:
+            # stat() of the file was taken before it was loaded
+            code_inside_loop += cse_code.write_manifest_entry(exp_hash=exp_hash, filename=filename)
+        if timings:
+            code_inside_loop += cse_code.write_to_file(code=f'"%s,%.3f\\n", {filename}, Time::HiRes::time() - $t0', filevar='TH')
+        if checkpoint:
+            code_inside_loop += cse_code.write_to_file(code=f'"expr\\t%s\\n", {filename}', filevar='CH')
+        yield gen_loop(code=code_inside_loop, array_var=res_files_array_name)
+        yield cse_code.gen_perl_close_file()
+        if manifest:
+            yield cse_code.gen_perl_close_file(filevar='MH')
+        if timings:
+            yield cse_code.gen_perl_close_file(filevar='TH')
+
+    # performance map code
+    pm_csv = convert_path(os.path.join(output_dir, 'performance_map.csv'))
+
+    work = pm_work_list(performance_map, domains, groups) if performance_map else []
+    if work:
+        # A handle of its own, $FH of the expressions is closed but still declared
+        if done and done['curves']:
+            yield cse_code.gen_perl_open_file(filename=pm_csv, filevar='PH', open_as='>>')
+        else:
+            yield cse_code.gen_perl_open_file(filename=pm_csv, filevar='PH')
+            code_to_write = '"CurveName, Inlet, Outlet, Gcorr, Pi_ts, Pi_tt, Eff, T1tot, T3tot, P1tot, P3tot\\n"'
+            yield cse_code.write_to_file(code=code_to_write, filevar='PH')
+        if checkpoint:
+            yield cse_code.gen_perl_autoflush(filevar='PH')
+        # One loop over the (curve, file, inlet, outlet) items of every curve
+        # on the same domains
+        code_inside_loop = cse_code.gen_perl_expressions(expressions=[
+            '$curve = $pm_curves[$i]', '$inlet = $pm_inlets[$i]', '$outlet = $pm_outlets[$i]'
+        ])
+        code_inside_loop += load_file
+        code_inside_loop += cse_code.pm_expressions(curve='$curve', inlet='$inlet', outlet='$outlet', hoist=True)
+        code_to_write = ('"%s, %s, %s' + ', %.5f' * 8 + '\\n", $curve, $inlet, $outlet, '
+            '$massFlow, $Pist, $Pitt, $eff, $T1tot, $T3tot, $P1tot, $P3tot')
+        code_inside_loop += cse_code.write_to_file(code=code_to_write, filevar='PH')
+        if checkpoint:
+            code_inside_loop += cse_code.write_to_file(code=f'"pm\\t%s\\t%s\\n", $curve, {filename}', filevar='CH')
+        for n, (curve_domains, items) in enumerate(work):
+            yield cse_code.load_domains(domains=list(curve_domains))
+            yield '' if groups else cse_code.turbo_init()
+            code = '' if not groups else cse_code.gen_perl_expressions(expressions=['$group = -1'])
+            columns = {} if not groups else {'groups': [item[4] for item in items]}
+            columns.update((varname, [item[k] for item in items])
+                for k, varname in enumerate(('pm_curves', 'files', 'pm_inlets', 'pm_outlets')))
+            code += perl_arrays(cse_code, output_dir, f'pm_{n}', columns)
+            code += cse_code.gen_perl_index_loop(code=code_inside_loop, array_var=res_files_array_name)
+            # The arrays of every domain group are declared in a scope of their own
+            yield cse_code.gen_perl_block(code)
+        yield cse_code.gen_perl_close_file(filevar='PH')
+
+
+
+def pm_work_list(performance_map: dict, domains: dict=None, groups: dict=None) -> list:
+    # [(domains to load, [(curve, res file, inlet, outlet, mesh group), ...])]
+    # in the order gen_script computes them: curves on the same domains
+    # together, with groups the files of a mesh group next to each other
+    cse_code = CodeGenerator()
+    work = {}
+    for curve, data in performance_map.items():
+        inlet = '' if not (i:=data['inlet']) else i
+        outlet = '' if not (o:=data['outlet']) else o
+        exps = cse_code.pm_expression_list(inlet=inlet, outlet=outlet)
+        items = work.setdefault(tuple(expression_domains(exps, domains or {})), [])
+        items += [(curve, f, inlet, outlet, 0) for f in data['files']]
+    if groups:
+        for curve_domains, items in work.items():
+            indices, numbers = group_order([item[1] for item in items], groups)
+            work[curve_domains] = [items[i][:4] + (n,) for i, n in zip(indices, numbers)]
+    return [(curve_domains, items) for curve_domains, items in work.items() if items]
+
+
+def write_session(output_dir: str, state: dict, done: dict=None) -> str:
+    # output.cse for the run state, after the files in done when resuming
+    res_files = state['res_files']
+    exps, header = output_expressions(state['expressions'])
+    cached = None
+    if state['cache']:
+        cache = ResultCache()
+        if done:
+            # Keep what the interrupted session computed
+            collect_results(cache, output_dir, res_files, exps, header=header)
+        cached = cached_values(cache, res_files, exps, header)
+    elif state['incremental']:
+        res_files = prepare_incremental(output_dir, res_files, expressions_hash(exps, header))[0]
+    elif done:
+        trim_csv(os.path.join(output_dir, 'output.csv'), len(done['files']))
+    if done:
+        trim_csv(os.path.join(output_dir, 'performance_map.csv'), sum(map(len, done['curves'].values())))
+
+    code = iter_script(
+        output_dir=convert_path(output_dir), expressions=state['expressions'], res_files=res_files,
+        domains=state['domains'], performance_map=state['performance_map'],
+        manifest=state['incremental'], cached=cached, checkpoint=True, done=done,
+        groups=state.get('groups')
+    )
+    cse = os.path.join(output_dir, 'output.cse')
+    write_script(code=code, cse=cse)
+    return cse
+
+
+def write_script(code, cse: str) -> None:
+    # code is the script or an iterable of its fragments, see iter_script
+    directory = os.path.split(cse)[0]
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    with open(cse, 'w') as f:
+        if isinstance(code, str):
+            f.write(code)
+        else:
+            f.writelines(code)
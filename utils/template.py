@@ -0,0 +1,18 @@
+import json
+
+
+def load_template(template_file: str) -> dict:
+    # Same layout as MainWindow.save_template_as writes. Expressions are
+    # returned in the form MainWindow.run collects them, the optional
+    # 'performance_map' is {curve: {'inlet': ..., 'outlet': ..., 'files': [...]}}.
+    with open(template_file, 'r') as tmp:
+        template = json.load(tmp)
+
+    expressions = [
+        {
+            'expression': f'{e["Variable"]} = {e["Expression"]}',
+            'description': e.get('Description', ''),
+            'add': bool(e.get('CheckState', 1))
+        } for e in template.get('expressions', [])
+    ]
+    return {'expressions': expressions, 'performance_map': template.get('performance_map', {})}
@@ -0,0 +1,45 @@
+import os
+
+from utils.parse_out import mesh_fingerprint, OUT_SUFFIXES
+
+
+def matching_out(res_file: str) -> str:
+    # The solver writes case_001.out next to case_001.res, archived runs
+    # may have it compressed
+    stem = os.path.splitext(res_file)[0]
+    return next((stem + suffix for suffix in OUT_SUFFIXES if os.path.exists(stem + suffix)), None)
+
+
+def mesh_groups(res_files: list, grouping: dict=None) -> dict:
+    # {res file: group} of the files that share a mesh, from the user
+    # grouping {group: [res files]} or else the mesh statistics of the
+    # matching .out. Files with neither are left out.
+    groups = {}
+    for group, files in (grouping or {}).items():
+        groups.update((f, f'user:{group}') for f in files)
+    for res_file in res_files:
+        if res_file in groups or not (out := matching_out(res_file)):
+            continue
+        try:
+            fingerprint = mesh_fingerprint(out)
+        except (OSError, ValueError):
+            continue
+        if fingerprint:
+            groups[res_file] = fingerprint
+    return {f: groups[f] for f in res_files if f in groups}
+
+
+def group_order(res_files: list, groups: dict) -> tuple:
+    # (indices, group numbers) that put the files of a group next to each
+    # other, groups in the order they first appear. A file without a group
+    # is a group of its own.
+    numbers = {}
+    keys = [numbers.setdefault(groups.get(f, ('file', f)), len(numbers)) for f in res_files]
+    indices = sorted(range(len(res_files)), key=lambda i: keys[i])
+    return indices, [keys[i] for i in indices]
+
+
+def group_files(res_files: list, groups: dict) -> tuple:
+    # (files, group numbers) in the order of group_order
+    indices, numbers = group_order(res_files, groups)
+    return [res_files[i] for i in indices], numbers
@@ -0,0 +1,104 @@
+import os
+import time
+
+from utils.batch import run_batch
+from utils.campaign import walk_files
+from utils.expressions import output_expressions
+from utils.incremental import expressions_hash, file_state, recorded_files
+from utils.parse_out import get_files
+from utils.script import convert_path
+from utils.topology import mesh_groups
+
+
+class FileWatcher:
+    # Polls a directory for .res files. A file is ready once its size and
+    # mtime stayed the same for settle seconds, so files the solver is
+    # still writing are left alone. A ready file that changes again is
+    # reported again. Paths are absolute, as convert_path gives them.
+    def __init__(self, directory: str, ext: str='res', settle: float=30.0, recursive: bool=False):
+        self.directory = os.path.abspath(directory)
+        self.ext = ext
+        self.settle = settle
+        self.recursive = recursive
+        self._pending = {}
+        self._done = {}
+
+    def skip(self, states: dict) -> None:
+        # {path: file_state} of files that are done while they keep that state
+        self._done.update(states)
+
+    def files(self) -> list:
+        if self.recursive:
+            files = walk_files([self.directory], exts=(self.ext,))
+        else:
+            files = sorted(get_files(ext=self.ext, directory=self.directory))
+        return [convert_path(f) for f in files]
+
+    def poll(self, now: float=None) -> list:
+        # Files that became ready since the last poll, oldest first
+        now = time.monotonic() if now is None else now
+        ready = []
+        for path in self.files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            state = (stat.st_size, stat.st_mtime_ns)
+            if self._done.get(path) == (str(stat.st_size), str(int(stat.st_mtime))):
+                continue
+            pending = self._pending.get(path)
+            if pending is None or pending[0] != state:
+                self._pending[path] = (state, now, stat.st_mtime)
+            elif now - pending[1] >= self.settle:
+                del self._pending[path]
+                self._done[path] = (str(stat.st_size), str(int(stat.st_mtime)))
+                ready.append((pending[2], path))
+        return [path for _, path in sorted(ready)]
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+
+def watch(directory: str, output_dir: str, expressions: list, domains: dict=None,
+        interval: float=10.0, settle: float=30.0, batch_size: int=20, recursive: bool=False,
+        topology: bool=False, idle: float=None, report: callable=print, **batch_kwargs) -> int:
+    # Runs the expressions on every .res file that lands in directory, at
+    # most batch_size files per incremental run_batch call, so their rows
+    # are appended to output.csv while the campaign goes on. Returns the
+    # number of computed files once nothing was pending for idle seconds,
+    # never without idle. Files output.manifest has in their current state
+    # are not run again. batch_kwargs go to run_batch.
+    output_dir = convert_path(output_dir)
+    exp_hash = expressions_hash(*output_expressions(expressions))
+    watcher = FileWatcher(directory, settle=settle, recursive=recursive)
+    watcher.skip(recorded_files(output_dir, exp_hash))
+    queue = []
+    computed = 0
+    last_activity = time.monotonic()
+    while True:
+        queue += [f for f in watcher.poll() if f not in queue]
+        if queue:
+            batch, queue = queue[:batch_size], queue[batch_size:]
+            # The files prepare_incremental leaves to run_batch
+            recorded = recorded_files(output_dir, exp_hash)
+            res_files = [f for f in batch if recorded.get(f) != file_state(f)]
+            if not res_files:
+                continue
+            missing = run_batch(
+                output_dir=output_dir, expressions=expressions, res_files=res_files,
+                domains=domains, incremental=True, groups=mesh_groups(res_files) if topology else None,
+                report=report, **batch_kwargs
+            )
+            computed += len(res_files) - len(missing)
+            report(f'{len(res_files) - len(missing)} of {len(res_files)} new res files in output.csv, '
+                f'{len(queue)} queued, {watcher.pending} still written')
+            for f in missing:
+                report(f'No results for {f}')
+            last_activity = time.monotonic()
+            continue
+        if watcher.pending:
+            last_activity = time.monotonic()
+        elif idle is not None and time.monotonic() - last_activity >= idle:
+            return computed
+        time.sleep(interval)